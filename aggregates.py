@@ -0,0 +1,154 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from constants import ALL_ROLES_OPTION, CSV_FILE, EMPTY_ROLE_OPTION
+from interfaces.form_response import AGGREGATE_HEADERS, DOMAIN_HEADERS
+from rollups import HISTOGRAM_BINS, RollupSummary
+
+
+class AggregateEngine:
+    """
+    Running count / sum / sum-of-squares per role for every domain and
+    subdomain score, updated with every batch the CSV writer commits, along
+    with a histogram of every domain score for its median, as kept by the
+    rollups.
+
+    Summaries are answered from these without rescanning rows. The engine
+    remembers the dataset revision (see dataset_version) its moments
+    reflect; callers should fall back to the rows for any other.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._moments = {}
+        self._histograms = {}
+        self._response_counts = {}
+        # Dataset revision the moments reflect, None if unknown
+        self.revision = None
+
+    def reset(self, version):
+        """Start over from an empty file at the given dataset version."""
+        with self._lock:
+            self._moments = {}
+            self._histograms = {}
+            self._response_counts = {}
+            self.revision = version.revision
+
+    def add_rows(self, rows, version):
+        """
+        Add a batch of parsed rows (as returned by FormResponse.parse_to_row)
+        appended to the file as the given dataset version, updating each
+        role's moments once. If the engine missed the change before, it no
+        longer reflects any revision.
+        """
+        values = np.array(
+            [[row.get(header) for header in AGGREGATE_HEADERS] for row in rows],
+            dtype=float,
+        )
+        present = ~np.isnan(values)
+        values = np.where(present, values, 0.0)
+        roles = np.array([row.get("role") or None for row in rows], dtype=object)
+        # Domain scores are the first columns of AGGREGATE_HEADERS
+        domains = len(DOMAIN_HEADERS)
+        bins = np.clip(np.rint(values[:, :domains]), 0, HISTOGRAM_BINS - 1).astype(int)
+
+        with self._lock:
+            if self.revision != version.revision - 1:
+                self.revision = None
+                return
+            for role in dict.fromkeys(roles):
+                selected = roles == role
+                if role not in self._moments:
+                    self._moments[role] = np.zeros((3, len(AGGREGATE_HEADERS)))
+                    self._histograms[role] = np.zeros(
+                        (domains, HISTOGRAM_BINS), dtype=np.int64
+                    )
+                    self._response_counts[role] = 0
+                moments = self._moments[role]
+                moments[0] += present[selected].sum(axis=0)
+                moments[1] += values[selected].sum(axis=0)
+                moments[2] += (values[selected] ** 2).sum(axis=0)
+                scored = present[selected][:, :domains]
+                columns = np.broadcast_to(np.arange(domains), scored.shape)
+                np.add.at(
+                    self._histograms[role],
+                    (columns[scored], bins[selected][scored]),
+                    1,
+                )
+                self._response_counts[role] += int(selected.sum())
+            self.revision = version.revision
+
+    def _roles(self, role_filter):
+        if role_filter == ALL_ROLES_OPTION:
+            return list(self._moments)
+        role = None if role_filter == EMPTY_ROLE_OPTION else role_filter
+        return [role] if role in self._moments else []
+
+    def summary(self, role_filter=ALL_ROLES_OPTION, revision=None):
+        """
+        Return count, mean and standard deviation per score column for the
+        given role filter. Means are NaN for columns without any scores.
+        With a revision, returns None unless the engine reflects exactly
+        that dataset revision.
+        """
+        with self._lock:
+            if revision is not None and revision != self.revision:
+                return None
+            moments = sum(
+                (self._moments[role] for role in self._roles(role_filter)),
+                np.zeros((3, len(AGGREGATE_HEADERS))),
+            )
+
+        count, total, total_sq = moments
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = total / count
+            variance = (total_sq - count * mean**2) / (count - 1)
+        return pd.DataFrame(
+            {
+                "count": count.astype(int),
+                "mean": mean,
+                "std": np.sqrt(np.clip(variance, 0, None)),
+            },
+            index=AGGREGATE_HEADERS,
+        )
+
+    def rollup_summary(self, role_filter=ALL_ROLES_OPTION, revision=None):
+        """
+        Return the RollupSummary of the rows for the given role filter, so
+        cohort metrics, medians included, can be built without the rows.
+        With a revision, returns None unless the engine reflects exactly
+        that dataset revision.
+        """
+        with self._lock:
+            if revision is not None and revision != self.revision:
+                return None
+            roles = self._roles(role_filter)
+            count, total, _ = sum(
+                (self._moments[role] for role in roles),
+                np.zeros((3, len(AGGREGATE_HEADERS))),
+            )
+            histograms = sum(
+                (self._histograms[role] for role in roles),
+                np.zeros((len(DOMAIN_HEADERS), HISTOGRAM_BINS), dtype=np.int64),
+            )
+            response_count = sum(self._response_counts[role] for role in roles)
+        return RollupSummary(
+            response_count=response_count,
+            counts=pd.Series(count.astype(int), index=AGGREGATE_HEADERS),
+            sums=pd.Series(total, index=AGGREGATE_HEADERS),
+            histograms=dict(zip(DOMAIN_HEADERS, histograms)),
+        )
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_aggregate_engine(path=CSV_FILE):
+    """Return the process-wide aggregate engine for the given CSV file."""
+    with _engines_lock:
+        if path not in _engines:
+            _engines[path] = AggregateEngine()
+        return _engines[path]
@@ -1,14 +1,40 @@
-import csv
 import gc
-import json
+import hashlib
+import math
 import os
+from datetime import date, datetime, time, timezone
 
+import requests
 import streamlit as st
+from tornado.ioloop import IOLoop
 from tornado.routing import PathMatches, Rule
-from tornado.web import Application, RequestHandler
+from tornado.web import Application, RequestHandler, stream_request_body
 
-from constants import CSV_FILE, REALTIME_FLAG_FILE
-from interfaces.form_response import FormResponse
+from bulk_ingest import EventStreamParser
+from cohort_export import EXPORT_FORMATS, find_cohort_export
+from constants import (
+    ALL_ROLES_OPTION,
+    CSV_FILE,
+    REALTIME_FLAG_FILE,
+    RESPONSE_STORE_FILE,
+)
+from dataset_version import get_dataset_version
+from instrumentation import RESPONSES_PARSED, WEBHOOKS, render_metrics
+from interfaces.form_response import DISPLAY_NAMES, SUBDOMAIN_MAPPING
+from metrics import get_range_metrics
+from response_store import ResponseStore, format_timestamp
+from response_writer import get_response_writer
+from shared_dataset import get_shared_dataset
+from typeform_api import FORM_ID, fill_range
+from webhook_queue import get_webhook_queue
+
+# Bulk bodies are streamed, so they may be far larger than Tornado's default
+BULK_MAX_BODY_BYTES = int(os.getenv("BULK_MAX_BODY_BYTES", str(512 * 1024 * 1024)))
+
+_responses_parsed_bulk = RESPONSES_PARSED.labels("bulk")
+
+# Bytes sent per write when streaming an export
+EXPORT_STREAM_CHUNK_BYTES = 256 * 1024
 
 
 @st.cache_resource()
@@ -31,30 +57,331 @@ class EmbeddedApiHandler(RequestHandler):
         pass
 
     def get(self):
-        self.write({"message": "Welcome to the CMRA Group Dashboard API"})
+        self.write(
+            {
+                "message": "Welcome to the CMRA Group Dashboard API",
+                "queue_depth": get_webhook_queue().depth,
+            }
+        )
 
     def post(self):
         # Check if real-time is enabled
         if not os.path.exists(REALTIME_FLAG_FILE):
+            WEBHOOKS.labels("ignored").inc()
             self.write({"status": "ignored", "reason": "real-time data not enabled"})
             return
 
-        # Get raw bytes
-        raw_body = self.request.body
+        # Parsing and persistence happen on the webhook workers, so the IOLoop
+        # that also serves the dashboard only has to enqueue the raw body.
+        if not get_webhook_queue().enqueue(self.request.body):
+            WEBHOOKS.labels("rejected").inc()
+            self.set_status(503)
+            self.set_header("Retry-After", "1")
+            self.write({"status": "rejected", "reason": "ingest queue full"})
+            return
+
+        WEBHOOKS.labels("accepted").inc()
+        self.set_status(202)
+        self.write({"status": "accepted"})
+
+
+@stream_request_body
+class BulkIngestHandler(RequestHandler):
+    """
+    Ingests many webhook events in one request, e.g. to replay a backlog
+    after an outage. The body is either newline-delimited JSON or a JSON
+    array of Typeform webhook events, and is decoded as it streams in.
+
+    Valid events are appended to the CSV and upserted into the response
+    store, each in one batch; invalid ones are skipped. Replayed events are
+    usually older than the newest stored response, which is why they go
+    into the store too: live rows only count from there on. The response reports the outcome of every event by index. A
+    body that can't be decoded as a whole (e.g. a truncated array) is
+    rejected without writing anything.
+    """
+
+    def check_xsrf_cookie(self):
+        # This handler will not perform XSRF checks
+        pass
+
+    def prepare(self):
+        if not os.path.exists(REALTIME_FLAG_FILE):
+            self.finish({"status": "ignored", "reason": "real-time data not enabled"})
+            return
+        self.request.connection.set_max_body_size(BULK_MAX_BODY_BYTES)
+        self._parser = EventStreamParser()
+
+    async def data_received(self, chunk):
+        # Decode off the IOLoop; Tornado reads the next chunk once this
+        # one is done, so a slow parse also slows the upload down.
+        await IOLoop.current().run_in_executor(None, self._parser.feed, chunk)
+
+    async def post(self):
+        parser = self._parser
+        await IOLoop.current().run_in_executor(None, self._commit, parser)
+        results = parser.results
+        if parser.error is not None:
+            # Nothing was written, including the events that were valid
+            results = [
+                (
+                    {**result, "status": "not_committed"}
+                    if result["status"] == "accepted"
+                    else result
+                )
+                for result in results
+            ]
+        accepted = sum(result["status"] == "accepted" for result in results)
+        body = {
+            "status": "committed" if parser.error is None else "rejected",
+            "accepted": accepted,
+            "rejected": len(results) - accepted,
+            "results": results,
+        }
+        if parser.error is not None:
+            self.set_status(400)
+            body["reason"] = parser.error
+        self.write(body)
+
+    def _commit(self, parser):
+        parser.close()
+        if parser.error is not None:
+            return
+        get_response_writer(CSV_FILE).write_many(parser.rows)
+        ResponseStore().upsert(FORM_ID, parser.columns())
+        _responses_parsed_bulk.inc(len(parser.rows))
+        print(f"Bulk ingested {len(parser.rows)} of {len(parser.results)} events")
+
+
+class ExportHandler(RequestHandler):
+    """
+    Downloads a cohort export registered by the dashboard (see
+    cohort_export.get_cohort_export), e.g. GET /api/export/<token>.parquet.
+    The file is rendered on the first request and streamed in chunks.
+    """
+
+    async def get(self, token, extension):
+        export = find_cohort_export(token)
+        if export is None or extension not in EXPORT_FORMATS:
+            self.set_status(404)
+            self.write({"error": "export not found; reload the dashboard"})
+            return
+
+        try:
+            path = await IOLoop.current().run_in_executor(
+                None, export.render, extension
+            )
+        except ValueError as e:
+            self.set_status(400)
+            self.write({"error": str(e)})
+            return
+
+        self.set_header("Content-Type", EXPORT_FORMATS[extension].mime)
+        self.set_header(
+            "Content-Disposition", f'attachment; filename="current_cohort.{extension}"'
+        )
+        self.set_header("Content-Length", os.path.getsize(path))
+        with open(path, "rb") as f:
+            while chunk := f.read(EXPORT_STREAM_CHUNK_BYTES):
+                self.write(chunk)
+                await self.flush()
 
-        # Decode to string (if needed)
-        body_str = raw_body.decode("utf-8")
 
-        data = json.loads(body_str)
-        print("Webhook received:", data["event_id"])
+class MetricsHandler(RequestHandler):
+    """Serves the instrumentation counters and histograms for Prometheus."""
+
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(render_metrics())
+
+
+def _number(value):
+    """JSON has no NaN; report scores without any responses as null."""
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def _domains_json(metrics):
+    return [
+        {
+            "domain": domain,
+            "name": DISPLAY_NAMES[domain],
+            "average_score": _number(stats.avg_score),
+            "median_score": _number(stats.median_score),
+            "top_subdomain": summary["Top Subdomain"],
+            "lowest_subdomain": summary["Lowest Subdomain"],
+        }
+        for (domain, stats), (_, summary) in zip(
+            metrics.domain_summary_stats.iterrows(),
+            metrics.domain_summary.iterrows(),
+        )
+    ]
+
+
+def _subdomains_json(metrics):
+    keys = [
+        (domain, subdomain)
+        for domain, subdomains in SUBDOMAIN_MAPPING.items()
+        for subdomain in subdomains
+    ]
+    # subdomain_scores has one row per subdomain in SUBDOMAIN_MAPPING order
+    return [
+        {
+            "domain": domain,
+            "subdomain": subdomain,
+            "name": DISPLAY_NAMES[subdomain],
+            "average_score": _number(average),
+        }
+        for (domain, subdomain), average in zip(
+            keys, metrics.subdomain_scores["avg_score"]
+        )
+    ]
+
+
+def _parse_time(value, end_of_day=False):
+    """
+    Parse an ISO 8601 query parameter into a Typeform timestamp string. A
+    bare date means the start of that day, or with end_of_day its last
+    second, so that it includes the whole day as an inclusive bound.
+    """
+    if not value:
+        return None
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+    else:
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return format_timestamp(parsed.astimezone(timezone.utc))
+
+
+def _live_snapshot():
+    """The live CSV's shared snapshot, or None while there is no live file."""
+    try:
+        return get_shared_dataset(CSV_FILE).snapshot()
+    except FileNotFoundError:
+        return None
+
+
+def _data_state():
+    """
+    Return the store's version, the state of the stored and live data on
+    disk, and the live snapshot. Dataset versions are only counted per
+    process, so ETags are derived from the state on disk instead, which any
+    process writing the data changes: the files' stat and the store's
+    latest rowid.
+    """
+    store_version = get_dataset_version(RESPONSE_STORE_FILE)
+    live = _live_snapshot()
+    live_state = None if live is None else (live.version.files, live.offset)
+    data_state = (store_version.files, ResponseStore().latest_rowid(), live_state)
+    return store_version, data_state, live
+
+
+def _needs_fill(since, until):
+    """
+    Whether the API should fetch the missing parts of [since, until] from
+    Typeform: only for ranges with both bounds in the past that aren't
+    fully fetched yet.
+    """
+    now = format_timestamp(datetime.now(timezone.utc))
+    if since is None or until is None or until >= now:
+        return False
+    return bool(ResponseStore().missing_ranges(FORM_ID, since, until))
+
+
+class AggregatesHandler(RequestHandler):
+    """
+    Read-only domain or subdomain averages of the stored responses and of
+    those received live, e.g.
+    GET /api/aggregates/domains?role=Leader&since=2025-04-01T00:00:00Z
+
+    Query parameters: role (a role, or the dashboard's "All" and
+    "Empty/Unknown" options), church (omit for all churches), and since /
+    until (ISO 8601, UTC unless an offset is given). Both bounds are
+    inclusive; a date-only until includes that whole day.
+
+    Parts of a range that ended in the past and that haven't been fetched
+    from Typeform yet are fetched first, as for the dashboard. Ranges
+    without a start or reaching the present are answered from the store
+    and the live rows as they are, so polling them never waits for
+    Typeform, and no request backfills the whole history. Results come from
+    the same cached rollup metrics as the dashboard. The ETag only depends
+    on the state of the data on disk and the filters, so a matching
+    If-None-Match is answered with 304 before anything is fetched or
+    computed.
+    """
+
+    def _set_etag(self, data_state, *filters):
+        request_key = (data_state, *filters)
+        self.set_header(
+            "Etag", f'"{hashlib.sha1(repr(request_key).encode()).hexdigest()}"'
+        )
+
+    async def get(self, kind):
+        try:
+            since = _parse_time(self.get_query_argument("since", None))
+            until = _parse_time(self.get_query_argument("until", None), end_of_day=True)
+        except ValueError as e:
+            self.set_status(400)
+            self.write({"error": f"invalid since/until: {e}"})
+            return
+        role_filter = self.get_query_argument("role", ALL_ROLES_OPTION)
+        church_filter = self.get_query_argument("church", None)
+        filters = (kind, since, until, role_filter, church_filter)
+
+        # Everything below reads SQLite, the CSV or Typeform; keep it off
+        # the IOLoop that also serves the dashboard.
+        loop = IOLoop.current()
+        store_version, data_state, live = await loop.run_in_executor(None, _data_state)
+        self._set_etag(data_state, *filters)
+        if self.check_etag_header():
+            self.set_status(304)
+            return
 
-        # Convert into domain object FormResponse
-        form_response = FormResponse(data["form_response"])
+        if await loop.run_in_executor(None, _needs_fill, since, until):
+            try:
+                await loop.run_in_executor(None, fill_range, since, until)
+            except requests.RequestException as e:
+                self.clear_header("Etag")
+                self.set_status(502)
+                self.write({"error": f"could not fetch the range from Typeform: {e}"})
+                return
+            store_version, data_state, live = await loop.run_in_executor(
+                None, _data_state
+            )
+            self._set_etag(data_state, *filters)
 
-        # Flatten and write to csv file
-        csv_data = form_response.parse_to_row()
-        with open(CSV_FILE, "a", newline="") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=csv_data.keys())
-            writer.writerow(csv_data)
+        live_table, live_key = None, None
+        if live is not None:
+            live_table, live_key = live.table, (live.version, live.offset)
 
-        self.write({"status": "success"})
+        metrics = await loop.run_in_executor(
+            None,
+            get_range_metrics,
+            store_version,
+            FORM_ID,
+            since,
+            until,
+            role_filter,
+            church_filter,
+            live_key,
+            live_table,
+        )
+        self.write(
+            {
+                "response_count": metrics.response_count,
+                "filters": {
+                    "since": since,
+                    "until": until,
+                    "role": role_filter,
+                    "church": church_filter,
+                },
+                kind: (
+                    _domains_json(metrics)
+                    if kind == "domains"
+                    else _subdomains_json(metrics)
+                ),
+            }
+        )
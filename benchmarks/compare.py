@@ -0,0 +1,51 @@
+"""
+Compare two benchmark suite reports and flag slowdowns.
+
+    python -m benchmarks.compare base.json head.json --threshold 0.1
+
+Exits with status 1 if any benchmark got slower by more than the threshold.
+"""
+
+import argparse
+import json
+import sys
+
+
+def load_results(path):
+    with open(path) as f:
+        report = json.load(f)
+    return {
+        (result["name"], result["rows"]): result["seconds"]
+        for result in report["results"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="allowed slowdown, e.g. 0.1"
+    )
+    args = parser.parse_args()
+
+    base = load_results(args.base)
+    head = load_results(args.head)
+
+    regressed = False
+    for key in sorted(base.keys() & head.keys()):
+        name, rows = key
+        change = head[key] / base[key] - 1 if base[key] else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        print(
+            f"{name:>32} {rows:>9,} rows: "
+            f"{base[key]:9.4f}s -> {head[key]:9.4f}s ({change:+7.1%}){flag}"
+        )
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
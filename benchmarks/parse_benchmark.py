@@ -0,0 +1,53 @@
+"""
+Compare per-item FormResponse parsing with the columnar batch parser.
+
+Run from the repository root:
+
+    python -m benchmarks.parse_benchmark --items 100000
+"""
+
+import argparse
+import time
+from datetime import datetime, timezone
+
+from interfaces.form_response import FormResponse, parse_responses_to_columns
+from typeform_mock import SyntheticResponses
+
+PAGE_SIZE = 1000
+
+
+def make_items(count, seed=0):
+    responses = SyntheticResponses(
+        count,
+        datetime(2025, 1, 1, tzinfo=timezone.utc),
+        datetime(2025, 8, 1, tzinfo=timezone.utc),
+        seed=seed,
+    )
+    return [responses.item(index) for index in range(count)]
+
+
+def bench_per_item(items):
+    for item in items:
+        FormResponse(item).parse_to_row()
+
+
+def bench_batch(items):
+    for start in range(0, len(items), PAGE_SIZE):
+        parse_responses_to_columns(items[start : start + PAGE_SIZE])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=100_000)
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    for name, bench in [("FormResponse", bench_per_item), ("batch", bench_batch)]:
+        started = time.perf_counter()
+        bench(items)
+        elapsed = time.perf_counter() - started
+        print(f"{name:>12}: {len(items) / elapsed:,.0f} items/sec")
+
+
+if __name__ == "__main__":
+    main()
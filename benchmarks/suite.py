@@ -0,0 +1,225 @@
+"""
+Time the parse, ingest, load and aggregation hot paths on synthetic cohorts.
+
+Run from the repository root and keep the JSON to compare against later
+commits (see benchmarks.compare):
+
+    python -m benchmarks.suite --sizes 1000 100000 1000000 --output head.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from constants import ALL_ROLES_OPTION, CSV_FILE
+from dataset_loader import load_table
+from interfaces.form_response import (
+    CSV_HEADERS,
+    FormResponse,
+    parse_responses_to_columns,
+)
+from metrics import compute_cohort_metrics
+from response_store import TIMESTAMP_FORMAT
+from response_writer import ResponseWriter, get_response_writer
+from rollups import aggregate_rows
+from shared_dataset import select_role
+from typeform_mock import SyntheticResponses
+from webhook_queue import WebhookQueue
+
+PAGE_SIZE = 1000
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+ROLE_FILTER = "Leader"
+
+
+def make_responses(count, seed=0):
+    return SyntheticResponses(
+        count,
+        datetime(2024, 1, 1, tzinfo=timezone.utc),
+        datetime(2025, 8, 1, tzinfo=timezone.utc),
+        seed=seed,
+    )
+
+
+def iter_pages(responses):
+    for start in range(0, responses.count, PAGE_SIZE):
+        end = min(start + PAGE_SIZE, responses.count)
+        yield start, [responses.item(index) for index in range(start, end)]
+
+
+def best_of(repeat, func):
+    """Return the fastest of `repeat` timed calls to func, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def bench_streaming(responses, repeat):
+    """
+    Time the per-response paths page by page, so a million responses never
+    have to be held in memory at once. Generating the items isn't timed.
+    """
+    writer = ResponseWriter(os.path.abspath("writer_append.csv"), max_batch_delay=3600)
+    # WebhookQueue._process writes through the process-wide writer for
+    # CSV_FILE, which is relative to the temporary working directory.
+    webhook_queue = WebhookQueue(maxsize=1, workers=0)
+    seconds = dict.fromkeys(
+        [
+            "parse.form_response",
+            "parse.batch_columns",
+            "ingest.writer_append",
+            "ingest.webhook_event",
+        ],
+        0.0,
+    )
+
+    get_response_writer(CSV_FILE).reset()
+
+    dataset = open("dataset.csv", "w", newline="")
+    with dataset, open(os.devnull, "w") as devnull:
+        for start, items in iter_pages(responses):
+            rows = [FormResponse(item).parse_to_row() for item in items]
+            bodies = [
+                json.dumps(responses.webhook_event(start + offset)).encode("utf-8")
+                for offset in range(len(items))
+            ]
+
+            seconds["parse.form_response"] += best_of(
+                repeat, lambda: [FormResponse(item).parse_to_row() for item in items]
+            )
+            seconds["parse.batch_columns"] += best_of(
+                repeat, lambda: parse_responses_to_columns(items)
+            )
+
+            def append_rows():
+                for row in rows:
+                    writer.write(row)
+                writer.flush()
+
+            seconds["ingest.writer_append"] += best_of(repeat, append_rows)
+
+            def process_events():
+                with contextlib.redirect_stdout(devnull):
+                    for body in bodies:
+                        webhook_queue._process(body)
+
+            seconds["ingest.webhook_event"] += best_of(repeat, process_events)
+
+            columns = parse_responses_to_columns(items)
+            pd.DataFrame({header: columns[header] for header in CSV_HEADERS}).to_csv(
+                dataset, header=start == 0, index=False
+            )
+
+    return seconds
+
+
+def bench_dataset(repeat):
+    """Time loading and aggregating the cohort written by bench_streaming."""
+    seconds = {}
+    seconds["load.read_csv"] = best_of(
+        repeat, lambda: load_table("dataset.csv", sidecar=False)
+    )
+    # The first call writes the sidecar, the timed ones read it
+    table, _ = load_table("dataset.csv")
+    seconds["load.feather_sidecar"] = best_of(repeat, lambda: load_table("dataset.csv"))
+    seconds["load.materialize_frame"] = best_of(
+        repeat, lambda: select_role(table, ALL_ROLES_OPTION).to_pandas()
+    )
+    df = table.to_pandas()
+
+    seconds["aggregate.cohort_metrics"] = best_of(
+        repeat, lambda: compute_cohort_metrics(df)
+    )
+    seconds["aggregate.cohort_metrics_role"] = best_of(
+        repeat, lambda: compute_cohort_metrics(df[df["role"] == ROLE_FILTER])
+    )
+    # Rollups are built from store rows, which are untyped text
+    store_rows = df.astype({"role": object, "church": object}).assign(
+        submitted_at=df["submitted_at"].dt.strftime(TIMESTAMP_FORMAT)
+    )
+    seconds["aggregate.hourly_rollups"] = best_of(
+        repeat, lambda: aggregate_rows(store_rows)
+    )
+    return seconds
+
+
+def run(sizes, repeat):
+    results = []
+    for size in sizes:
+        responses = make_responses(size)
+        with tempfile.TemporaryDirectory() as workdir:
+            cwd = os.getcwd()
+            os.chdir(workdir)
+            try:
+                seconds = bench_streaming(responses, repeat)
+                seconds.update(bench_dataset(repeat))
+            finally:
+                os.chdir(cwd)
+
+        for name, elapsed in seconds.items():
+            results.append(
+                {
+                    "name": name,
+                    "rows": size,
+                    "seconds": elapsed,
+                    "rows_per_second": size / elapsed if elapsed else None,
+                }
+            )
+            print(
+                f"{name:>32} {size:>9,} rows: {size / elapsed:>12,.0f} rows/sec",
+                file=sys.stderr,
+            )
+    return results
+
+
+def metadata(repeat):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "repeat": repeat,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "metadata": metadata(args.repeat),
+        "results": run(args.sizes, args.repeat),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
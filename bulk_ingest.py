@@ -0,0 +1,173 @@
+import codecs
+import json
+import os
+
+import numpy as np
+
+from interfaces.form_response import CSV_HEADERS, FormResponse
+
+# Largest single event accepted in a bulk body. This also bounds how much of
+# an unterminated event is buffered: an oversized NDJSON line is rejected and
+# the rest of it dropped, and since a JSON array can't be split into items
+# without decoding them, an oversized array item fails the whole body.
+BULK_MAX_EVENT_BYTES = int(os.getenv("BULK_MAX_EVENT_BYTES", str(1024 * 1024)))
+
+_WHITESPACE = " \t\r\n"
+
+
+class EventStreamParser:
+    """
+    Incrementally decodes a body of Typeform webhook events, given either as
+    newline-delimited JSON or as one JSON array, and validates each event by
+    parsing it into a FormResponse.
+
+    Feed the body in chunks of any size; only the current, incomplete event
+    is buffered. Every event produces a result in `results`, and the rows of
+    the valid ones are collected in `rows`, and their response tokens in
+    `response_ids`, in the same order.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.response_ids = []
+        self.results = []
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        # None until the first non-whitespace character: "ndjson" or "array"
+        self._format = None
+        self._array_closed = False
+        # Set while the rest of an oversized NDJSON line is being dropped
+        self._skipping_line = False
+        self._error = None
+
+    @property
+    def error(self):
+        """Why the body as a whole could not be decoded, if it couldn't."""
+        return self._error
+
+    def feed(self, chunk):
+        if self._error is not None:
+            return
+        try:
+            self._buffer += self._text_decoder.decode(chunk)
+        except UnicodeDecodeError as e:
+            self._error = f"invalid UTF-8: {e}"
+            return
+        self._drain(final=False)
+
+    def close(self):
+        """Decode whatever remains once the whole body has been fed."""
+        if self._error is not None:
+            return
+        try:
+            self._buffer += self._text_decoder.decode(b"", final=True)
+        except UnicodeDecodeError as e:
+            self._error = f"invalid UTF-8: {e}"
+            return
+        self._drain(final=True)
+        if self._error is None and self._format == "array" and not self._array_closed:
+            self._error = "unterminated JSON array"
+
+    def _drain(self, final):
+        if self._format is None:
+            self._buffer = self._buffer.lstrip(_WHITESPACE)
+            if not self._buffer:
+                return
+            if self._buffer[0] == "[":
+                self._format = "array"
+                self._buffer = self._buffer[1:]
+            else:
+                self._format = "ndjson"
+
+        if self._format == "ndjson":
+            self._drain_lines(final)
+        else:
+            self._drain_array(final)
+
+    def _drain_lines(self, final):
+        if self._skipping_line:
+            newline = self._buffer.find("\n")
+            if newline == -1:
+                self._buffer = ""
+                return
+            self._buffer = self._buffer[newline + 1 :]
+            self._skipping_line = False
+
+        lines = self._buffer.split("\n")
+        self._buffer = "" if final else lines.pop()
+        for line in lines:
+            if line.strip():
+                self._add_event(line)
+
+        if len(self._buffer) > BULK_MAX_EVENT_BYTES:
+            # Reject the event now instead of buffering the rest of it
+            self._add_result("rejected", error="event too large")
+            self._buffer = ""
+            self._skipping_line = True
+
+    def _drain_array(self, final):
+        position = 0
+        buffer = self._buffer
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE + ",":
+                position += 1
+            if position == len(buffer):
+                break
+            if self._array_closed:
+                self._error = "unexpected data after the JSON array"
+                return
+            if buffer[position] == "]":
+                self._array_closed = True
+                position += 1
+                continue
+            try:
+                event, end = self._decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                # Most likely the event continues in the next chunk
+                if final or len(buffer) - position > BULK_MAX_EVENT_BYTES:
+                    self._error = f"invalid JSON array item: {e}"
+                    return
+                break
+            self._add_decoded_event(event)
+            position = end
+        self._buffer = buffer[position:]
+
+    def _add_event(self, line):
+        if len(line) > BULK_MAX_EVENT_BYTES:
+            self._add_result("rejected", error="event too large")
+            return
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError as e:
+            self._add_result("rejected", error=f"invalid JSON: {e}")
+            return
+        self._add_decoded_event(event)
+
+    def _add_decoded_event(self, event):
+        event_id = event.get("event_id") if isinstance(event, dict) else None
+        try:
+            response_id = event["form_response"]["token"]
+            row = FormResponse(event["form_response"]).parse_to_row()
+        except Exception as e:
+            self._add_result("rejected", event_id, f"invalid form_response: {e!r}")
+            return
+        self.rows.append(row)
+        self.response_ids.append(response_id)
+        self._add_result("accepted", event_id)
+
+    def columns(self):
+        """
+        The rows of the valid events as column arrays, as returned by
+        parse_responses_to_columns, e.g. for ResponseStore.upsert.
+        """
+        columns = {"response_id": np.array(self.response_ids, dtype=object)}
+        for header in CSV_HEADERS:
+            columns[header] = np.array([row[header] for row in self.rows], dtype=object)
+        return columns
+
+    def _add_result(self, status, event_id=None, error=None):
+        result = {"index": len(self.results), "event_id": event_id, "status": status}
+        if error is not None:
+            result["error"] = error
+        self.results.append(result)
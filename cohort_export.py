@@ -0,0 +1,148 @@
+import os
+import secrets
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, NamedTuple
+
+import openpyxl
+import pyarrow.parquet as pq
+
+from instrumentation import ROWS_WRITTEN, STAGE_SECONDS
+from shared_dataset import select_role
+
+# Rendered exports kept on disk, oldest dropped first
+EXPORT_CACHE_ENTRIES = int(os.getenv("EXPORT_CACHE_ENTRIES", "16"))
+# Rows converted and written at a time, so no export is built in memory whole
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+
+# Excel caps a sheet at 1,048,576 rows, one of which is the header
+EXCEL_MAX_ROWS = 1_048_575
+
+_export_seconds = STAGE_SECONDS.labels("export")
+_rows_exported = ROWS_WRITTEN.labels("export")
+
+
+def _write_csv(table, f):
+    # Chunks go through pandas so values are formatted as df.to_csv would
+    for start in range(0, max(table.num_rows, 1), EXPORT_CHUNK_ROWS):
+        frame = table.slice(start, EXPORT_CHUNK_ROWS).to_pandas()
+        f.write(frame.to_csv(index=False, header=start == 0).encode("utf-8"))
+
+
+def _write_parquet(table, f):
+    pq.write_table(table, f, row_group_size=EXPORT_CHUNK_ROWS)
+
+
+def _write_excel(table, f):
+    if table.num_rows > EXCEL_MAX_ROWS:
+        raise ValueError(
+            f"{table.num_rows} rows don't fit in an Excel sheet; export CSV or Parquet"
+        )
+    # A write-only workbook streams rows out as they are appended instead of
+    # keeping every cell of the sheet in memory
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    sheet.append(table.column_names)
+    for start in range(0, table.num_rows, EXPORT_CHUNK_ROWS):
+        frame = table.slice(start, EXPORT_CHUNK_ROWS).to_pandas()
+        # Missing values are empty cells, as df.to_excel writes them
+        frame = frame.astype(object).where(frame.notna(), None)
+        for row in frame.itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(f)
+
+
+class ExportFormat(NamedTuple):
+    label: str
+    mime: str
+    write: Callable
+
+
+EXPORT_FORMATS = {
+    "csv": ExportFormat("CSV", "text/csv", _write_csv),
+    "parquet": ExportFormat(
+        "Parquet", "application/vnd.apache.parquet", _write_parquet
+    ),
+    "xlsx": ExportFormat(
+        "Excel",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        _write_excel,
+    ),
+}
+
+_export_dir = tempfile.mkdtemp(prefix="cmra-exports-")
+
+
+class CohortExport:
+    """
+    A cohort that can be downloaded in any of EXPORT_FORMATS. Files are
+    only rendered when first requested and are then served from disk until
+    the export is evicted.
+    """
+
+    def __init__(self, load, role_filter):
+        # Random, so download links can't be guessed
+        self.token = secrets.token_urlsafe(16)
+        self._load = load
+        self._role_filter = role_filter
+        self._lock = threading.Lock()
+
+    def path(self, extension):
+        return os.path.join(_export_dir, f"{self.token}.{extension}")
+
+    def render(self, extension):
+        """Return the path of the export in the given format, writing it once."""
+        path = self.path(extension)
+        with self._lock:
+            if not os.path.exists(path):
+                table = select_role(self._load(), self._role_filter)
+                temp_path = f"{path}.tmp"
+                with _export_seconds.time(), open(temp_path, "wb") as f:
+                    EXPORT_FORMATS[extension].write(table, f)
+                os.replace(temp_path, path)
+                _rows_exported.inc(table.num_rows)
+        return path
+
+    def remove(self):
+        for extension in EXPORT_FORMATS:
+            try:
+                os.remove(self.path(extension))
+            except FileNotFoundError:
+                pass
+
+
+_exports = OrderedDict()
+_exports_by_token = {}
+_exports_lock = threading.Lock()
+
+
+def get_cohort_export(dataset_key, role_filter, load) -> CohortExport:
+    """
+    Return the process-wide export of the rows matching role_filter of the
+    table returned by load, which is only called when a file is rendered.
+    dataset_key must identify the exact rows of that table, as for
+    get_cohort_metrics; the same cohort always gets the same export, and so
+    the same download links.
+    """
+    key = (dataset_key, role_filter)
+    with _exports_lock:
+        export = _exports.get(key)
+        if export is not None:
+            _exports.move_to_end(key)
+            return export
+
+        export = CohortExport(load, role_filter)
+        _exports[key] = export
+        _exports_by_token[export.token] = export
+        while len(_exports) > EXPORT_CACHE_ENTRIES:
+            _, evicted = _exports.popitem(last=False)
+            del _exports_by_token[evicted.token]
+            evicted.remove()
+        return export
+
+
+def find_cohort_export(token):
+    """Return the export with the given token, or None if it was evicted."""
+    with _exports_lock:
+        return _exports_by_token.get(token)
@@ -1,7 +1,7 @@
 from datetime import timedelta, timezone
 
 CSV_FILE = "form_responses.csv"
-COMPARISON_CSV_FILE = "comparison_form_responses.csv"
+RESPONSE_STORE_FILE = "form_responses.sqlite3"
 REALTIME_FLAG_FILE = "realtime_enabled.flag"
 
 ALL_ROLES_OPTION = "All"
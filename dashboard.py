@@ -1,26 +1,50 @@
 import os
+import time
 from datetime import datetime, timezone
 
 import pandas as pd
-import plotly.graph_objects as go
 import streamlit as st
-from streamlit_autorefresh import st_autorefresh
 
-from api_server import EmbeddedApiHandler, setup_api_handler
+from aggregates import get_aggregate_engine
+from api_server import (
+    AggregatesHandler,
+    BulkIngestHandler,
+    EmbeddedApiHandler,
+    ExportHandler,
+    MetricsHandler,
+    setup_api_handler,
+)
+from cohort_export import EXPORT_FORMATS, get_cohort_export
 from constants import (
     ALL_ROLES_OPTION,
-    COMPARISON_CSV_FILE,
     CSV_FILE,
     EMPTY_ROLE_OPTION,
     REALTIME_FLAG_FILE,
+    RESPONSE_STORE_FILE,
     UTC_PLUS_8,
 )
-from interfaces.form_response import (
-    CSV_HEADERS,
-    DISPLAY_NAMES,
-    DOMAIN_HEADERS,
+from dataset_loader import read_csv_table, table_from_rows
+from dataset_version import get_dataset_version
+from figures import (
+    comparison_bar_figure,
+    domain_radar_figure,
+    subdomain_bar_figure,
+    subdomain_heatmap_figure,
+)
+from instrumentation import RERUN_SECONDS, STAGE_SECONDS
+from interfaces.form_response import DISPLAY_NAMES, SUBDOMAIN_MAPPING
+from metrics import get_cohort_metrics, get_range_metrics
+from response_store import format_timestamp
+from shared_dataset import (
+    append_newer,
+    get_range_roles,
+    get_range_table,
+    get_shared_dataset,
+    role_values,
 )
-from typeform_api import clear_csv, fetch_typeform_responses
+from typeform_api import FORM_ID, clear_csv, fetch_typeform_responses
+
+rerun_started = time.perf_counter()
 
 st.set_page_config(
     page_title="CMRA Group Dashboard",
@@ -31,34 +55,94 @@ st.set_page_config(
 
 # Embed webhook API endpoint into the dashboard
 setup_api_handler("/api/4g53n9xd5o", EmbeddedApiHandler)
+setup_api_handler("/api/4g53n9xd5o/bulk", BulkIngestHandler)
+setup_api_handler("/metrics", MetricsHandler)
+setup_api_handler("/api/aggregates/(domains|subdomains)", AggregatesHandler)
+setup_api_handler(r"/api/export/([\w-]+)\.(\w+)", ExportHandler)
 
+# Seconds between refreshes of the cohort panels in real-time mode
+LIVE_REFRESH_SECONDS = 5
 
-# read csv from a URL
-@st.cache_data
-def get_data() -> pd.DataFrame:
-    try:
-        result = pd.read_csv(CSV_FILE)
-        return result
-    except pd.errors.EmptyDataError:
-        return pd.DataFrame(columns=CSV_HEADERS)
-
-
-@st.cache_data
-def get_data_comparison() -> pd.DataFrame:
-    try:
-        return pd.read_csv(COMPARISON_CSV_FILE)
-    except pd.errors.EmptyDataError:
-        return pd.DataFrame(columns=CSV_HEADERS)
+figure_seconds = STAGE_SECONDS.labels("figures")
+live_panels_seconds = STAGE_SECONDS.labels("live_panels")
 
 
+# The cohorts are process-wide Arrow tables shared by every session; a
+# session only materializes the rows matching its filters.
 def refresh_data():
-    st.cache_data.clear()
-    return get_data()
-
-
-def refresh_data_comparison():
-    st.cache_data.clear()
-    return get_data_comparison()
+    """
+    Return the live cohort table and a key identifying its exact rows.
+    The table is only reread when the dataset version changed, and only the
+    appended rows are read if the file was appended to (e.g. by webhooks).
+    """
+    snapshot = get_shared_dataset(CSV_FILE).snapshot()
+    return snapshot.table, (CSV_FILE, snapshot.version, snapshot.offset)
+
+
+def range_data(start, end):
+    """
+    Return a function reading the stored responses between start and end,
+    and a key identifying them. Each session reads its own range, so
+    sessions looking at different ranges don't overwrite each other's data.
+    Only the key is computed here: the panels are rendered from the store's
+    rollups, so the rows are only read when something needs them, such as
+    an export.
+    """
+    store_version = get_dataset_version(RESPONSE_STORE_FILE)
+    since, until = format_timestamp(start), format_timestamp(end)
+
+    def load():
+        return get_range_table(store_version, FORM_ID, since, until)
+
+    return load, ("range", store_version, since, until)
+
+
+def loaded(table):
+    """Return a function returning a table that is already in memory."""
+    return lambda: table
+
+
+def load_data():
+    """
+    Return a function loading this session's cohort table for its mode and
+    fetched range, and a key identifying the table's rows.
+    """
+    realtime = st.session_state["last_realtime_state"]
+    combine_live = st.session_state["last_combine_live_state"]
+    start, end = st.session_state["last_fetched_range"]
+    if realtime and not combine_live:
+        table, key = refresh_data()
+        return loaded(table), key
+    if start is None:
+        # Nothing fetched yet
+        return loaded(table_from_rows([])), ("empty",)
+    if not realtime:
+        return range_data(start, end)
+
+    # Historical responses from the start, followed by newer live ones
+    load_history, (_, store_version, since, _) = range_data(start, None)
+    live, live_key = refresh_data()
+
+    def load():
+        return append_newer(load_history(), live)
+
+    return load, ("combined", store_version, since, live_key)
+
+
+def cohort_roles(load, key):
+    """
+    Roles of the cohort for the role filter. Stored ranges take theirs from
+    the rollups rather than reading the rows.
+    """
+    if key[0] == "range":
+        _, store_version, since, until = key
+        return get_range_roles(store_version, FORM_ID, since, until)
+    if key[0] == "combined":
+        _, store_version, since, _ = key
+        live, _ = refresh_data()
+        roles = get_range_roles(store_version, FORM_ID, since, None)
+        return list(dict.fromkeys(roles + role_values(live)))
+    return role_values(load())
 
 
 # SESSION STATE
@@ -70,16 +154,9 @@ if "last_realtime_state" not in st.session_state:
     st.session_state["last_realtime_state"] = False
 if "last_combine_live_state" not in st.session_state:
     st.session_state["last_combine_live_state"] = False
-refresh_count = (
-    st_autorefresh(interval=5000, key="datarefresh")
-    if st.session_state["last_realtime_state"]
-    else None
-)
-print("Auto-refresh count:", refresh_count)
 
 # Initial data load
-df = refresh_data()
-df_comp = refresh_data_comparison()
+load_table, dataset_key = load_data()
 
 
 # dashboard title
@@ -93,13 +170,14 @@ uploaded_file = st.file_uploader(
     key="import_csv",
 )
 if uploaded_file is not None:
-    df = pd.read_csv(uploaded_file)
+    load_table = loaded(read_csv_table(uploaded_file.getvalue()))
+    dataset_key = ("upload", uploaded_file.file_id)
     st.success("CSV file successfully imported and loaded as current cohort!")
 
 # == FILTERS SECTION ==
 all_filters_disabled = uploaded_file is not None
-role_options = [ALL_ROLES_OPTION, EMPTY_ROLE_OPTION] + list(
-    pd.unique(df["role"].dropna())
+role_options = [ALL_ROLES_OPTION, EMPTY_ROLE_OPTION] + cohort_roles(
+    load_table, dataset_key
 )
 role_filter = st.selectbox("Role", role_options, disabled=all_filters_disabled)
 
@@ -112,8 +190,7 @@ with realtime_data_col:
 if enable_realtime_data != st.session_state["last_realtime_state"]:
     st.session_state["last_realtime_state"] = enable_realtime_data
     clear_csv()
-    df = refresh_data()
-    df_comp = refresh_data_comparison()
+    load_table, dataset_key = load_data()
 
     if enable_realtime_data:
         with open(REALTIME_FLAG_FILE, "w") as f:
@@ -134,8 +211,9 @@ with combine_live_with_historical_col:
 if combine_live != st.session_state["last_combine_live_state"]:
     st.session_state["last_combine_live_state"] = combine_live
     clear_csv()
-    df = refresh_data()
-    df_comp = refresh_data_comparison()
+    # The history to combine with depends on the mode; fetch it again
+    st.session_state["last_fetched_range"] = (None, None)
+    load_table, dataset_key = load_data()
 
 end_range_disabled = all_filters_disabled or enable_realtime_data
 start_range_disabled = all_filters_disabled or (
@@ -171,280 +249,147 @@ if ((start_datetime != last_start) or (end_datetime != last_end)) and (
     not enable_realtime_data or (enable_realtime_data and combine_live)
 ):
     with st.spinner("Fetching data from Typeform..."):
-        fetch_typeform_responses(
-            start_datetime,
-            datetime.now() if enable_realtime_data and combine_live else end_datetime,
-        )
-        df = refresh_data()
+        if enable_realtime_data and combine_live:
+            # Combined mode is open-ended: only sync responses newer than the
+            # last high-water mark instead of refetching all history.
+            fetch_typeform_responses(start_datetime, None, incremental=True)
+        else:
+            fetch_typeform_responses(start_datetime, end_datetime)
     st.session_state["last_fetched_range"] = (start_datetime, end_datetime)
+    load_table, dataset_key = load_data()
+
+
+def cohort_source():
+    """Return a function loading this session's cohort table, and its key."""
+    if uploaded_file is not None:
+        return load_table, dataset_key
+    return load_data()
+
+
+def current_cohort():
+    """
+    Return the metrics of this session's cohort. Everything is memoized, so
+    calling this on a live refresh only does work when the data changed.
+    """
+    # Every section renders from this one memoized result. Historical
+    # ranges, alone or combined with the live rows newer than them, are
+    # answered from the response store's rollups without reading the rows.
+    if uploaded_file is None and not enable_realtime_data:
+        return get_range_metrics(
+            get_dataset_version(RESPONSE_STORE_FILE),
+            FORM_ID,
+            format_timestamp(start_datetime),
+            format_timestamp(end_datetime),
+            role_filter,
+        )
+    if uploaded_file is None and combine_live:
+        live_table, live_key = refresh_data()
+        return get_range_metrics(
+            get_dataset_version(RESPONSE_STORE_FILE),
+            FORM_ID,
+            format_timestamp(start_datetime),
+            None,
+            role_filter,
+            live_key=live_key,
+            _live_table=live_table,
+        )
 
-df["submitted_at"] = pd.to_datetime(df["submitted_at"])
-# Convert timezone-aware datetime to timezone-naive for comparison
-df["submitted_at"] = df["submitted_at"].dt.tz_localize(None)
-
-# creating a single-element container
-placeholder = st.empty()
-
-# Apply dataframe filters
-if role_filter == EMPTY_ROLE_OPTION:
-    df = df[df["role"].isna() | (df["role"] == "")]
-elif role_filter != ALL_ROLES_OPTION:
-    df = df[df["role"] == role_filter]
-
-st.info(str(df.shape[0]) + " responses from Typeform for the selected date/time range.")
+    # In live mode the CSV writer keeps running per-role aggregates, so the
+    # metrics are built from there instead of rescanning every row, provided
+    # the engine is at exactly the version of the rows loaded.
+    load_cohort, cohort_key = cohort_source()
+    live_summary = None
+    if uploaded_file is None:
+        _, live_version, _ = cohort_key
+        live_summary = get_aggregate_engine(CSV_FILE).rollup_summary(
+            role_filter, revision=live_version.revision
+        )
+    return get_cohort_metrics(cohort_key, role_filter, load_cohort, live_summary)
 
 
-# == DOMAIN SUMMARY SECTION (Table) ==
-df_domain_scores = df.melt(
-    id_vars=[col for col in df.columns if col not in DOMAIN_HEADERS],
-    value_vars=DOMAIN_HEADERS,
-    var_name="domain",
-    value_name="domain_score",
-)
+# The page is split into fragments that rerun on their own: only the cohort
+# panels are on the live refresh timer, and the comparison and export
+# sections rerun when their own inputs change. The page is rendered for
+# one cohort key (see cohort_source); once a refresh of the panels finds
+# the rows changed, the whole page reruns, so every section shows the same
+# current cohort. Changing any filter above also reruns the whole page.
+live_refresh_interval = LIVE_REFRESH_SECONDS if enable_realtime_data else None
 
-# Remove any rows with missing scores
-df_domain_scores = df_domain_scores.dropna(subset=["domain_score"])
 
-# Now create the domain summary
-domain_summary_stats = (
-    df_domain_scores.groupby("domain")
-    .agg({"domain_score": ["mean", "median"]})
-    .round(2)
-)
+@st.fragment(run_every=live_refresh_interval)
+def cohort_panels(page_cohort_key):
+    panels_started = time.perf_counter()
+    _, cohort_key = cohort_source()
+    if cohort_key != page_cohort_key:
+        st.rerun()
+    cohort_metrics = current_cohort()
+    is_empty = cohort_metrics.response_count == 0
+    domain_summary_stats = cohort_metrics.domain_summary_stats
 
-# Flatten column names
-domain_summary_stats.columns = ["avg_score", "median_score"]
-
-# Define subdomain mappings for each domain
-subdomain_mapping = {
-    "discipleship": ["education", "training"],
-    "sending": ["sending1", "membercare"],
-    "support": ["praying", "giving", "community"],
-    "structure": ["organisation", "policies", "partnerships"],
-}
-
-# Calculate top and lowest subdomains for each domain
-top_subdomains = []
-lowest_subdomains = []
-
-for domain in domain_summary_stats.index:
-    subdomains = subdomain_mapping[domain]
-
-    # Calculate mean scores for each subdomain in this domain
-    subdomain_means = df[subdomains].mean()
-
-    # Find top and lowest subdomain
-    top_subdomain = subdomain_means.idxmax()
-    lowest_subdomain = subdomain_means.idxmin()
-
-    top_subdomains.append(DISPLAY_NAMES[top_subdomain])
-    lowest_subdomains.append(DISPLAY_NAMES[lowest_subdomain])
-
-# Create the final dataframe
-domain_summary = pd.DataFrame(
-    {
-        "Domain": [DISPLAY_NAMES[domain] for domain in domain_summary_stats.index],
-        "Average Score": domain_summary_stats["avg_score"],
-        "Median Score": domain_summary_stats["median_score"],
-        "Top Subdomain": top_subdomains,
-        "Lowest Subdomain": lowest_subdomains,
-    }
-).reset_index(drop=True)
-
-st.markdown("### Domain Summary")
-st.dataframe(domain_summary, use_container_width=True, hide_index=True)
-
-
-st.markdown("### Visualization Panel")
-# == RADAR CHART SECTION ==
-# Create radar chart data
-radar_data = domain_summary_stats.reset_index()
-radar_data["domain_display"] = [
-    DISPLAY_NAMES[domain] for domain in radar_data["domain"]
-]
-
-domain_radar = go.Figure()
-
-domain_radar.add_trace(
-    go.Scatterpolar(
-        r=radar_data["avg_score"],
-        theta=radar_data["domain_display"],
-        fill="toself",
-        name="Average Score",
-        line_color="rgb(32, 201, 151)",
-        fillcolor="rgba(32, 201, 151, 0.2)",
+    st.info(
+        str(cohort_metrics.response_count)
+        + " responses from Typeform for the selected date/time range."
     )
-)
-
-domain_radar.update_layout(
-    polar=dict(
-        radialaxis=dict(
-            visible=True,
-            range=[0, 100],  # Assuming scores are 0-100
-        ),
-        angularaxis=dict(
-            tickfont=dict(size=24),  # <-- Angular axis tick font size
-        ),
-    ),
-    showlegend=True,
-    title="Domain Average Scores",
-    height=500,
-    font=dict(size=18),
-    hoverlabel=dict(font_size=18),
-)
-
 
-# == SUBDOMAIN BAR CHART SECTION ==
-# Create subdomain data with domain prefixes for clearer grouping
-subdomain_data = []
-
-for domain, subdomains in subdomain_mapping.items():
-    for subdomain in subdomains:
-        avg_score = df[subdomain].mean()
-        subdomain_data.append(
-            {
-                "domain": DISPLAY_NAMES[domain],
-                "subdomain": DISPLAY_NAMES[subdomain],
-                "subdomain_full": f"{DISPLAY_NAMES[domain]}: {DISPLAY_NAMES[subdomain]}",
-                "avg_score": round(avg_score, 2),
-            }
-        )
-
-subdomain_df = pd.DataFrame(subdomain_data)
-
-# Create single bar chart with color coding by domain
-subdomain_bar = go.Figure()
-
-domains = subdomain_df["domain"].unique()
-colors = [
-    "rgb(32, 201, 151)",
-    "rgb(255, 99, 71)",
-    "rgb(54, 162, 235)",
-    "rgb(255, 206, 86)",
-]
-color_map = {domain: colors[i % len(colors)] for i, domain in enumerate(domains)}
-
-subdomain_bar.add_trace(
-    go.Bar(
-        x=subdomain_df["subdomain_full"],
-        y=subdomain_df["avg_score"],
-        marker_color=[color_map[domain] for domain in subdomain_df["domain"]],
-        text=subdomain_df["avg_score"],
-        textposition="auto",
-        showlegend=False,
+    st.markdown("### Domain Summary")
+    st.dataframe(
+        cohort_metrics.domain_summary, use_container_width=True, hide_index=True
     )
-)
 
-subdomain_bar.update_layout(
-    title="Average Scores by Subdomain",
-    xaxis_title="Subdomains",
-    yaxis_title="Average Score",
-    height=500,
-    xaxis={"tickangle": 45, "title_font": {"size": 20}, "tickfont": {"size": 14}},
-    yaxis={
-        "title_font": {"size": 20},
-        "tickfont": {"size": 18},
-    },
-    font=dict(size=18),
-    hoverlabel=dict(font_size=18),
-)
+    st.markdown("### Visualization Panel")
+    # Building and sending the figures is timed as one stage
+    figures_started = time.perf_counter()
 
-domain_radar_col, subdomain_bar_col = st.columns(2)
-with domain_radar_col:
-    st.plotly_chart(domain_radar, use_container_width=True)
-with subdomain_bar_col:
-    st.plotly_chart(subdomain_bar, use_container_width=True)
-
-# == SUBDOMAIN HEATMAP SECTION ==
-# Prepare data for heatmap
-heatmap_data = []
-domain_labels = []
-subdomain_labels = []
-
-for domain, subdomains in subdomain_mapping.items():
-    for subdomain in subdomains:
-        avg_score = df[subdomain].mean()
-        heatmap_data.append([round(avg_score, 2)])
-        domain_labels.append(DISPLAY_NAMES[domain])
-        subdomain_labels.append(DISPLAY_NAMES[subdomain])
-
-# Create heatmap
-heatmap_fig = go.Figure(
-    data=go.Heatmap(
-        z=heatmap_data,
-        x=["Average Score"],
-        y=[
-            f"{domain}: {subdomain}"
-            for domain, subdomain in zip(domain_labels, subdomain_labels)
-        ],
-        # colorscale="RdYlGn",
-        autocolorscale=True,
-        text=heatmap_data,
-        texttemplate="%{text}",
-        textfont={"size": 18},
-        colorbar=dict(title="Score"),
-        hoverongaps=False,
+    # == RADAR CHART SECTION ==
+    domain_radar = domain_radar_figure(
+        tuple(DISPLAY_NAMES[domain] for domain in domain_summary_stats.index),
+        tuple(domain_summary_stats["avg_score"]),
     )
-)
-
-heatmap_fig.update_layout(
-    title="Subdomain Average Scores Heatmap",
-    height=600,
-    yaxis={
-        "autorange": "reversed",
-        "tickfont": {"size": 18},
-    },
-    xaxis={"side": "top"},
-    font=dict(size=18),
-    hoverlabel=dict(font_size=18),
-)
-
-st.plotly_chart(heatmap_fig, use_container_width=True)
 
-# == INSIGHTS SECTION ==
-st.markdown("### Summary Insights")
-if df.empty:
-    st.warning("No data available for the selected filters and date range.")
-else:
-    # Find all subdomain average scores
-    all_subdomain_scores = []
-    for domain, subdomains in subdomain_mapping.items():
-        for subdomain in subdomains:
-            avg_score = df[subdomain].mean()
-            all_subdomain_scores.append(
-                {
-                    "subdomain": DISPLAY_NAMES[subdomain],
-                    "avg_score": round(avg_score, 2),
-                }
-            )
+    # == SUBDOMAIN BAR CHART SECTION ==
+    subdomain_df = cohort_metrics.subdomain_scores
+    subdomain_names = tuple(subdomain_df["subdomain_full"])
+    subdomain_scores = tuple(subdomain_df["avg_score"])
+    subdomain_bar = subdomain_bar_figure(
+        tuple(subdomain_df["domain"]), subdomain_names, subdomain_scores
+    )
 
-    subdomain_scores_df = pd.DataFrame(all_subdomain_scores)
-
-    # Sort by score and get the top 3 and lowest 3
-    top_subdomains = subdomain_scores_df.nlargest(3, "avg_score")["subdomain"].tolist()
-    lowest_subdomains = subdomain_scores_df.nsmallest(3, "avg_score")[
-        "subdomain"
-    ].tolist()
-
-    # Display top 3 subdomains in green boxes with average scores
-    st.markdown("**This cohort's strongest subdomains are:**")
-    top_cols = st.columns(3)
-    for i, subdomain in enumerate(top_subdomains):
-        avg = subdomain_scores_df[subdomain_scores_df["subdomain"] == subdomain][
-            "avg_score"
-        ].values[0]
-        with top_cols[i]:
-            st.success(f"**{subdomain}**\n\nAvg Score: **{avg:.2f}%**")
-
-    # Display lowest 3 subdomains in yellow boxes with average scores
-    st.markdown("**Areas for greatest improvement:**")
-    improvement_cols = st.columns(3)
-    for i, subdomain in enumerate(lowest_subdomains):
-        avg = subdomain_scores_df[subdomain_scores_df["subdomain"] == subdomain][
-            "avg_score"
-        ].values[0]
-        with improvement_cols[i]:
-            st.warning(f"**{subdomain}**\n\nAvg Score: **{avg:.2f}%**")
+    domain_radar_col, subdomain_bar_col = st.columns(2)
+    with domain_radar_col:
+        st.plotly_chart(domain_radar, use_container_width=True)
+    with subdomain_bar_col:
+        st.plotly_chart(subdomain_bar, use_container_width=True)
+
+    # == SUBDOMAIN HEATMAP SECTION ==
+    heatmap_fig = subdomain_heatmap_figure(subdomain_names, subdomain_scores)
+    st.plotly_chart(heatmap_fig, use_container_width=True)
+    figure_seconds.observe(time.perf_counter() - figures_started)
+
+    # == INSIGHTS SECTION ==
+    st.markdown("### Summary Insights")
+    if is_empty:
+        st.warning("No data available for the selected filters and date range.")
+    else:
+        # Display top 3 subdomains in green boxes with average scores
+        st.markdown("**This cohort's strongest subdomains are:**")
+        top_cols = st.columns(3)
+        for i, (subdomain, avg) in enumerate(cohort_metrics.strongest_subdomains):
+            with top_cols[i]:
+                st.success(f"**{subdomain}**\n\nAvg Score: **{avg:.2f}%**")
+
+        # Display lowest 3 subdomains in yellow boxes with average scores
+        st.markdown("**Areas for greatest improvement:**")
+        improvement_cols = st.columns(3)
+        for i, (subdomain, avg) in enumerate(cohort_metrics.weakest_subdomains):
+            with improvement_cols[i]:
+                st.warning(f"**{subdomain}**\n\nAvg Score: **{avg:.2f}%**")
+    live_panels_seconds.observe(time.perf_counter() - panels_started)
+
+
+@st.fragment
+def comparison_section():
+    cohort_metrics = current_cohort()
+    score_means = cohort_metrics.score_means
 
     # == COMPARISON COHORT SECTION ==
     st.markdown("#### Comparison Cohort Selection")
@@ -483,35 +428,33 @@ else:
 
     if (comp_start_datetime != comp_last_start) or (comp_end_datetime != comp_last_end):
         with st.spinner("Fetching data from Typeform..."):
-            fetch_typeform_responses(
-                comp_start_datetime, comp_end_datetime, is_comparison=True
-            )
-            df_comp = refresh_data_comparison()
+            fetch_typeform_responses(comp_start_datetime, comp_end_datetime)
         st.session_state["last_fetched_range_comp"] = (
             comp_start_datetime,
             comp_end_datetime,
         )
 
-    df_comp["submitted_at"] = pd.to_datetime(df_comp["submitted_at"])
-    df_comp["submitted_at"] = df_comp["submitted_at"].dt.tz_localize(None)
-
-    if role_filter == EMPTY_ROLE_OPTION:
-        df_comp = df_comp[df_comp["role"].isna() | (df_comp["role"] == "")]
-    elif role_filter != ALL_ROLES_OPTION:
-        df_comp = df_comp[df_comp["role"] == role_filter]
+    comparison_metrics = get_range_metrics(
+        get_dataset_version(RESPONSE_STORE_FILE),
+        FORM_ID,
+        format_timestamp(comp_start_datetime),
+        format_timestamp(comp_end_datetime),
+        role_filter,
+    )
+    comp_count = comparison_metrics.response_count
 
     st.info(
         "Comparison cohort has "
-        + str(df_comp.shape[0])
+        + str(comp_count)
         + " responses from Typeform for the selected date/time range."
     )
 
-    # Calculate average scores for each subdomain in both cohorts
+    # Compare average scores for each subdomain in both cohorts
     subdomain_compare_data = []
-    for domain, subdomains in subdomain_mapping.items():
+    for domain, subdomains in SUBDOMAIN_MAPPING.items():
         for subdomain in subdomains:
-            current_avg = df[subdomain].mean() if not df.empty else 0
-            comp_avg = df_comp[subdomain].mean() if not df_comp.empty else 0
+            current_avg = score_means[subdomain]
+            comp_avg = comparison_metrics.score_means[subdomain] if comp_count else 0
             # Calculate percentage difference, handle division by zero
             if comp_avg == 0:
                 pct_diff = 0 if current_avg == 0 else 100
@@ -530,49 +473,45 @@ else:
     subdomain_compare_df = pd.DataFrame(subdomain_compare_data)
 
     # Bar chart comparing subdomains
-    compare_bar = go.Figure()
-
-    compare_bar.add_trace(
-        go.Bar(
-            x=subdomain_compare_df["subdomain"],
-            y=subdomain_compare_df["Previous Cohort"],
-            name="Previous",
-            marker_color="rgb(255, 99, 71)",
-        )
-    )
-    compare_bar.add_trace(
-        go.Bar(
-            x=subdomain_compare_df["subdomain"],
-            y=subdomain_compare_df["Current Cohort"],
-            name="Current",
-            marker_color="rgb(32, 201, 151)",
-            text=[f"{pct:+.1f}%" for pct in subdomain_compare_df["Difference"]],
-            textposition="outside",
-            textfont=dict(size=22),
-        )
+    figures_started = time.perf_counter()
+    compare_bar = comparison_bar_figure(
+        tuple(subdomain_compare_df["subdomain"]),
+        tuple(subdomain_compare_df["Previous Cohort"]),
+        tuple(subdomain_compare_df["Current Cohort"]),
+        tuple(subdomain_compare_df["Difference"]),
     )
+    st.plotly_chart(compare_bar, use_container_width=True)
+    figure_seconds.observe(time.perf_counter() - figures_started)
+
+
+@st.fragment
+def export_section():
+    # == EXPORT SECTION ==
+    st.markdown("### Export Current Cohort Data")
+    # Files are only rendered when a link is opened, and are cached per
+    # cohort and filter; see cohort_export. In live mode the page reruns
+    # once the panels find new rows, so the links always point at the
+    # latest rows and at an export that was just used, which eviction drops
+    # last.
+    load_cohort, cohort_key = cohort_source()
+    export = get_cohort_export(cohort_key, role_filter, load_cohort)
+    is_empty = current_cohort().response_count == 0
+    for column, (extension, export_format) in zip(
+        st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS.items()
+    ):
+        with column:
+            st.link_button(
+                f"Download Current Cohort as {export_format.label}",
+                f"/api/export/{export.token}.{extension}",
+                disabled=is_empty,
+            )
 
-    compare_bar.update_layout(
-        barmode="group",
-        title="Subdomain Average Scores: Current vs. Previous Cohort",
-        xaxis_title="Subdomain",
-        yaxis_title="Average Score",
-        height=700,
-        xaxis={"tickangle": 45, "tickfont": {"size": 18}, "title_font": {"size": 20}},
-        yaxis={"tickfont": {"size": 18}, "title_font": {"size": 20}},
-        hoverlabel=dict(font_size=18),
-        legend=dict(font=dict(size=22)),
-    )
 
-    st.plotly_chart(compare_bar, use_container_width=True)
+page_cohort_key = cohort_source()[1]
+is_empty = current_cohort().response_count == 0
+cohort_panels(page_cohort_key)
+if not is_empty:
+    comparison_section()
+export_section()
 
-# == EXPORT SECTION ==
-st.markdown("### Export Current Cohort Data")
-csv_export = df.to_csv(index=False).encode("utf-8")
-st.download_button(
-    label="Download Current Cohort as CSV",
-    data=csv_export,
-    file_name="current_cohort.csv",
-    mime="text/csv",
-    disabled=df.empty,
-)
+RERUN_SECONDS.observe(time.perf_counter() - rerun_started)
@@ -0,0 +1,179 @@
+import io
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
+
+from instrumentation import STAGE_SECONDS
+from interfaces.form_response import CSV_HEADERS, SCORE_HEADERS
+
+CATEGORY_HEADERS = ["role", "church"]
+
+
+def _column_type(header):
+    if header in SCORE_HEADERS:
+        return pa.float64()
+    if header in CATEGORY_HEADERS:
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.string()
+
+
+# Explicit column types, so nothing is inferred on load. submitted_at is
+# read as text and parsed once in _to_frame.
+CSV_SCHEMA = pa.schema([(header, _column_type(header)) for header in CSV_HEADERS])
+
+_CONVERT_OPTIONS = pa_csv.ConvertOptions(
+    column_types=CSV_SCHEMA, strings_can_be_null=True
+)
+
+# Sidecar metadata keys recording which state of the CSV a sidecar holds
+_SIZE_KEY = b"csv_size"
+_MTIME_KEY = b"csv_mtime_ns"
+_CONSUMED_KEY = b"csv_bytes_consumed"
+
+
+def sidecar_path(path):
+    return os.path.splitext(path)[0] + ".feather"
+
+
+def _parse_timestamps(column):
+    """Parse ISO 8601 text into naive UTC timestamps, keeping nulls."""
+    try:
+        # Typeform timestamps carry a "Z" offset
+        utc = pc.cast(column, pa.timestamp("ns", tz="UTC"))
+        return pc.cast(utc, pa.timestamp("ns"))
+    except pa.ArrowInvalid:
+        pass
+    try:
+        # Exported cohorts have already been converted to naive UTC
+        return pc.cast(column, pa.timestamp("ns"))
+    except pa.ArrowInvalid:
+        parsed = pd.to_datetime(column.to_pandas(), utc=True, format="ISO8601")
+        return pa.array(parsed.dt.tz_localize(None), type=pa.timestamp("ns"))
+
+
+def _parse_submitted_at(table):
+    # The dashboard compares submitted_at as naive UTC datetimes
+    index = table.schema.get_field_index("submitted_at")
+    if index == -1:
+        return table
+    return table.set_column(
+        index, "submitted_at", _parse_timestamps(table["submitted_at"])
+    )
+
+
+def read_csv_table(data, header=True) -> pa.Table:
+    """
+    Parse responses CSV bytes with the typed schema: scores as floats,
+    role and church as dictionary-encoded text and submitted_at as naive
+    UTC timestamps. Without a header, columns are taken to be CSV_HEADERS.
+    """
+    if not data.strip():
+        return _parse_submitted_at(CSV_SCHEMA.empty_table())
+    read_options = (
+        pa_csv.ReadOptions() if header else pa_csv.ReadOptions(column_names=CSV_HEADERS)
+    )
+    table = pa_csv.read_csv(
+        io.BytesIO(data), read_options=read_options, convert_options=_CONVERT_OPTIONS
+    )
+    return _parse_submitted_at(table)
+
+
+def table_from_rows(rows) -> pa.Table:
+    """
+    Build a typed table from tuples of CSV_HEADERS values, e.g. rows read
+    from the response store, with the same types as read_csv_table.
+    """
+    columns = zip(*rows) if rows else [[] for _ in CSV_HEADERS]
+    table = pa.Table.from_arrays(
+        [
+            pa.array(column, type=field.type)
+            for column, field in zip(columns, CSV_SCHEMA)
+        ],
+        schema=CSV_SCHEMA,
+    )
+    return _parse_submitted_at(table)
+
+
+def table_from_columns(columns) -> pa.Table:
+    """
+    Build a typed table from column arrays keyed by CSV_HEADERS, as returned
+    by parse_responses_to_columns. NaN scores become nulls.
+    """
+    table = pa.Table.from_arrays(
+        [
+            pa.array(columns[field.name], type=field.type, from_pandas=True)
+            for field in CSV_SCHEMA
+        ],
+        schema=CSV_SCHEMA,
+    )
+    return _parse_submitted_at(table)
+
+
+def _read_sidecar(path, stat):
+    try:
+        # Sidecars are uncompressed, so a memory-mapped read copies nothing
+        table = feather.read_table(sidecar_path(path), memory_map=True)
+    except (OSError, pa.ArrowInvalid):
+        return None
+    metadata = table.schema.metadata or {}
+    if (
+        metadata.get(_SIZE_KEY) != str(stat.st_size).encode()
+        or metadata.get(_MTIME_KEY) != str(stat.st_mtime_ns).encode()
+    ):
+        return None
+    return table.replace_schema_metadata(None), int(metadata[_CONSUMED_KEY])
+
+
+def _write_sidecar(path, stat, table, consumed):
+    metadata = {
+        _SIZE_KEY: str(stat.st_size).encode(),
+        _MTIME_KEY: str(stat.st_mtime_ns).encode(),
+        _CONSUMED_KEY: str(consumed).encode(),
+    }
+    # Write to a temporary file first so readers never see a partial sidecar
+    temp_path = f"{sidecar_path(path)}.{os.getpid()}.tmp"
+    try:
+        feather.write_feather(
+            table.replace_schema_metadata(metadata),
+            temp_path,
+            compression="uncompressed",
+        )
+        os.replace(temp_path, sidecar_path(path))
+    except OSError as e:
+        print("Failed to write dataset sidecar:", repr(e))
+
+
+@STAGE_SECONDS.labels("read_csv").time()
+def load_table(path, offset=0, sidecar=True) -> tuple[pa.Table, int]:
+    """
+    Read a responses CSV from a byte offset, returning the typed rows and
+    the number of bytes consumed. Only complete lines are consumed, so a
+    partially flushed row is picked up by the next read. Reads from a
+    non-zero offset expect no header line.
+
+    Full reads are served from a Feather sidecar next to the CSV when it
+    was written from the file's current size and mtime, and refresh the
+    sidecar otherwise.
+    """
+    # Stat before reading: if the file changes while it is read, the
+    # sidecar is simply considered stale next time.
+    stat = os.stat(path)
+    use_sidecar = sidecar and offset == 0
+    if use_sidecar:
+        cached = _read_sidecar(path, stat)
+        if cached is not None:
+            return cached
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    data = data[: data.rfind(b"\n") + 1]
+    table = read_csv_table(data, header=offset == 0)
+
+    if use_sidecar:
+        _write_sidecar(path, stat, table, len(data))
+    return table, len(data)
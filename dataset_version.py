@@ -0,0 +1,118 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+
+
+class FileState(NamedTuple):
+    mtime_ns: int
+    size: int
+    inode: int
+
+
+class DatasetVersion(NamedTuple):
+    # Bumped whenever the file is rewritten from scratch, or changed by
+    # anything other than this process
+    generation: int
+    # Bumped on every change, including appends
+    revision: int
+    # os.stat of the file (and of a SQLite database's write-ahead log) as of
+    # this version, so the version also differs across processes
+    files: tuple = ()
+
+
+def file_state(path) -> tuple:
+    """
+    Return the state of path and of its SQLite write-ahead log, if any, as
+    FileStates or None for missing files. Committed SQLite transactions may
+    only touch the log, so both are needed to notice a change. An empty log
+    is what any open connection leaves behind and counts as missing.
+    """
+    states = []
+    for name in (path, f"{path}-wal"):
+        try:
+            stat = os.stat(name)
+        except FileNotFoundError:
+            states.append(None)
+            continue
+        if name != path and stat.st_size == 0:
+            states.append(None)
+            continue
+        states.append(FileState(stat.st_mtime_ns, stat.st_size, stat.st_ino))
+    return tuple(states)
+
+
+class _Dataset:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = DatasetVersion(0, 0)
+        # File state as of the last change this process recorded
+        self.files: Optional[tuple] = None
+
+    def refresh_locked(self, path):
+        files = file_state(path)
+        if files != self.files:
+            # Changed by another process (or by hand). Whether rows were
+            # only appended can't be told, so treat it as a rewrite.
+            generation, revision, _ = self.version
+            self.version = DatasetVersion(generation + 1, revision + 1, files)
+            self.files = files
+        return self.version
+
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+
+def _dataset(path) -> _Dataset:
+    key = os.path.abspath(path)
+    with _datasets_lock:
+        if key not in _datasets:
+            _datasets[key] = _Dataset()
+        return _datasets[key]
+
+
+def get_dataset_version(path) -> DatasetVersion:
+    """
+    Return the current version of a dataset file. Changes made by this
+    process are recorded with changing(); any other change to the file is
+    noticed from its stat and counts as a rewrite.
+    """
+    dataset = _dataset(path)
+    with dataset.lock:
+        return dataset.refresh_locked(path)
+
+
+@contextmanager
+def changing(path, rewritten=False):
+    """
+    Hold while this process changes the file, e.g. appends rows or replaces
+    it (rewritten=True). Yields the version the file will have once the
+    block exits. Readers asking for the version meanwhile wait, so a change
+    in progress is never mistaken for one made outside this process.
+    """
+    dataset = _dataset(path)
+    with dataset.lock:
+        generation, revision, _ = dataset.refresh_locked(path)
+        if rewritten:
+            generation += 1
+        # The final file state is only known once the block is done
+        version = DatasetVersion(generation, revision + 1)
+        yield version
+        dataset.files = file_state(path)
+        dataset.version = version._replace(files=dataset.files)
+
+
+@contextmanager
+def bookkeeping(path):
+    """
+    Hold while this process writes to the file without changing the data
+    its versions stand for, e.g. a SQLite table recording what has been
+    fetched. The version is kept, so nothing cached for it is invalidated,
+    and the write isn't mistaken for a change made outside this process.
+    """
+    dataset = _dataset(path)
+    with dataset.lock:
+        dataset.refresh_locked(path)
+        yield
+        dataset.files = file_state(path)
@@ -0,0 +1,44 @@
+import threading
+
+from response_store import MAX_TIMESTAMP, MIN_TIMESTAMP
+
+
+class FetchCoordinator:
+    """
+    Coalesces concurrent fetches of overlapping submitted_at ranges.
+
+    A fetch only starts once no overlapping fetch is in flight; until then
+    the caller waits. Fetches are expected to skip whatever the store
+    already covers, so a caller that waited on an identical range finds
+    nothing left to do, and one that waited on an overlapping range only
+    fetches the remainder. Fetches of disjoint ranges run in parallel.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (since, until) -> Event set when that fetch finishes
+        self._in_flight = {}
+
+    def run(self, since, until, fetch):
+        """Call fetch() for [since, until] once no overlapping fetch is running."""
+        key = (since or MIN_TIMESTAMP, until or MAX_TIMESTAMP)
+        while True:
+            with self._lock:
+                overlapping = [
+                    done
+                    for (other_since, other_until), done in self._in_flight.items()
+                    if other_since <= key[1] and key[0] <= other_until
+                ]
+                if not overlapping:
+                    done = threading.Event()
+                    self._in_flight[key] = done
+                    break
+            for other_done in overlapping:
+                other_done.wait()
+
+        try:
+            return fetch()
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            done.set()
@@ -0,0 +1,169 @@
+import numpy as np
+import plotly.graph_objects as go
+import streamlit as st
+
+# Figures are cached by the aggregate values they plot, passed as tuples so
+# Streamlit can hash them. Only building the figure is cached: st.plotly_chart
+# still validates and serializes it to JSON on every rerun, which takes about
+# 2ms per chart here. Streamlit has no public way to pass a serialized spec.
+# Since an unchanged figure serializes identically, it isn't sent to the
+# browser again, though: Streamlit answers repeated messages with a reference
+# to the copy the browser already has (see global.minCachedMessageSize in
+# .streamlit/config.toml). The returned figures are shared between sessions
+# and must not be mutated.
+
+SUBDOMAIN_COLORS = [
+    "rgb(32, 201, 151)",
+    "rgb(255, 99, 71)",
+    "rgb(54, 162, 235)",
+    "rgb(255, 206, 86)",
+]
+
+
+@st.cache_resource(max_entries=32)
+def domain_radar_figure(domain_names, avg_scores) -> go.Figure:
+    """Radar of the average score per domain."""
+    domain_radar = go.Figure()
+
+    domain_radar.add_trace(
+        go.Scatterpolar(
+            # Plotly serializes arrays more compactly than lists
+            r=np.asarray(avg_scores),
+            theta=domain_names,
+            fill="toself",
+            name="Average Score",
+            line_color="rgb(32, 201, 151)",
+            fillcolor="rgba(32, 201, 151, 0.2)",
+        )
+    )
+
+    domain_radar.update_layout(
+        polar=dict(
+            radialaxis=dict(
+                visible=True,
+                range=[0, 100],  # Assuming scores are 0-100
+            ),
+            angularaxis=dict(
+                tickfont=dict(size=24),  # <-- Angular axis tick font size
+            ),
+        ),
+        showlegend=True,
+        title="Domain Average Scores",
+        height=500,
+        font=dict(size=18),
+        hoverlabel=dict(font_size=18),
+    )
+    return domain_radar
+
+
+@st.cache_resource(max_entries=32)
+def subdomain_bar_figure(domain_names, subdomain_names, avg_scores) -> go.Figure:
+    """Bar per subdomain, colored by domain."""
+    # Create single bar chart with color coding by domain
+    subdomain_bar = go.Figure()
+
+    color_map = {
+        domain: SUBDOMAIN_COLORS[i % len(SUBDOMAIN_COLORS)]
+        for i, domain in enumerate(dict.fromkeys(domain_names))
+    }
+
+    subdomain_bar.add_trace(
+        go.Bar(
+            x=subdomain_names,
+            y=np.asarray(avg_scores),
+            marker_color=[color_map[domain] for domain in domain_names],
+            text=np.asarray(avg_scores),
+            textposition="auto",
+            showlegend=False,
+        )
+    )
+
+    subdomain_bar.update_layout(
+        title="Average Scores by Subdomain",
+        xaxis_title="Subdomains",
+        yaxis_title="Average Score",
+        height=500,
+        xaxis={"tickangle": 45, "title_font": {"size": 20}, "tickfont": {"size": 14}},
+        yaxis={
+            "title_font": {"size": 20},
+            "tickfont": {"size": 18},
+        },
+        font=dict(size=18),
+        hoverlabel=dict(font_size=18),
+    )
+    return subdomain_bar
+
+
+@st.cache_resource(max_entries=32)
+def subdomain_heatmap_figure(subdomain_names, avg_scores) -> go.Figure:
+    """Single-column heatmap of the average score per subdomain."""
+    heatmap_data = [[avg_score] for avg_score in avg_scores]
+
+    heatmap_fig = go.Figure(
+        data=go.Heatmap(
+            z=heatmap_data,
+            x=["Average Score"],
+            y=subdomain_names,
+            # colorscale="RdYlGn",
+            autocolorscale=True,
+            text=heatmap_data,
+            texttemplate="%{text}",
+            textfont={"size": 18},
+            colorbar=dict(title="Score"),
+            hoverongaps=False,
+        )
+    )
+
+    heatmap_fig.update_layout(
+        title="Subdomain Average Scores Heatmap",
+        height=600,
+        yaxis={
+            "autorange": "reversed",
+            "tickfont": {"size": 18},
+        },
+        xaxis={"side": "top"},
+        font=dict(size=18),
+        hoverlabel=dict(font_size=18),
+    )
+    return heatmap_fig
+
+
+@st.cache_resource(max_entries=32)
+def comparison_bar_figure(
+    subdomain_names, previous_scores, current_scores, differences
+) -> go.Figure:
+    """Grouped bars of the previous and current cohort per subdomain."""
+    compare_bar = go.Figure()
+
+    compare_bar.add_trace(
+        go.Bar(
+            x=subdomain_names,
+            y=np.asarray(previous_scores),
+            name="Previous",
+            marker_color="rgb(255, 99, 71)",
+        )
+    )
+    compare_bar.add_trace(
+        go.Bar(
+            x=subdomain_names,
+            y=np.asarray(current_scores),
+            name="Current",
+            marker_color="rgb(32, 201, 151)",
+            text=[f"{pct:+.1f}%" for pct in differences],
+            textposition="outside",
+            textfont=dict(size=22),
+        )
+    )
+
+    compare_bar.update_layout(
+        barmode="group",
+        title="Subdomain Average Scores: Current vs. Previous Cohort",
+        xaxis_title="Subdomain",
+        yaxis_title="Average Score",
+        height=700,
+        xaxis={"tickangle": 45, "tickfont": {"size": 18}, "title_font": {"size": 20}},
+        yaxis={"tickfont": {"size": 18}, "title_font": {"size": 20}},
+        hoverlabel=dict(font_size=18),
+        legend=dict(font=dict(size=22)),
+    )
+    return compare_bar
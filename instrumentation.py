@@ -0,0 +1,240 @@
+import bisect
+import threading
+import time
+from contextlib import ContextDecorator
+
+# Upper bounds in seconds, chosen to span a fast CSV append up to a full
+# multi-page Typeform fetch.
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+def _escape(label_value):
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    """
+    A metric family with optional labels. Children are created once per
+    label value tuple and then updated under their own lock, so hot paths
+    should keep a reference to the child rather than calling labels() on
+    every update.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        values = tuple(str(value) for value in values)
+        with self._lock:
+            if values not in self._children:
+                self._children[values] = self._new_child()
+            return self._children[values]
+
+    def _default_child(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return self.labels()
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        return (
+            "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+        )
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """A monotonically increasing total."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default_child().inc(amount)
+
+    def _render_child(self, values, child):
+        yield f"{self.name}{self._label_text(values)} {child.value:g}"
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, child):
+        self._child = child
+
+    def _recreate_cm(self):
+        # A fresh timer per decorated call, so concurrent calls don't share
+        # a start time
+        return _Timer(self._child)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+
+    def time(self):
+        """Time a block or function and observe its duration in seconds."""
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with their sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default_child().observe(value)
+
+    def time(self):
+        return self._default_child().time()
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts = list(child.counts)
+            total = child.total
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            labels = self._label_text(values, [("le", le)])
+            yield f"{self.name}_bucket{labels} {cumulative}"
+        yield f"{self.name}_sum{self._label_text(values)} {total:g}"
+        yield f"{self.name}_count{self._label_text(values)} {cumulative}"
+
+
+class Gauge(_Metric):
+    """A value read from a callback each time the metrics are rendered."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, function):
+        self.function = function
+        super().__init__(name, documentation)
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            f"{self.name} {self.function():g}",
+        ]
+
+
+_registry = []
+
+
+def render_metrics():
+    """Return every registered metric in the Prometheus text format."""
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "cmra_stage_seconds",
+    "Time spent in each stage of the fetch, ingest and render pipeline.",
+    ["stage"],
+)
+TYPEFORM_PAGES = Counter(
+    "cmra_typeform_pages_total",
+    "Response pages returned by the Typeform client, by where they came from.",
+    ["source"],
+)
+TYPEFORM_RETRIES = Counter(
+    "cmra_typeform_retries_total",
+    "Typeform API requests retried after a connection error, 429 or 5xx.",
+)
+RESPONSES_PARSED = Counter(
+    "cmra_responses_parsed_total",
+    "Typeform responses parsed into rows.",
+    ["path"],
+)
+ROWS_WRITTEN = Counter(
+    "cmra_rows_written_total",
+    "Rows written to CSV files.",
+    ["file"],
+)
+WEBHOOKS = Counter(
+    "cmra_webhooks_total",
+    "Webhook deliveries by outcome.",
+    ["outcome"],
+)
+WEBHOOK_LATENCY_SECONDS = Histogram(
+    "cmra_webhook_latency_seconds",
+    "Time from a webhook being accepted until its row is handed to the writer.",
+)
+RERUN_SECONDS = Histogram(
+    "cmra_rerun_seconds",
+    "Duration of complete dashboard script runs.",
+)
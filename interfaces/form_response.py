@@ -1,5 +1,7 @@
 from enum import Enum
 
+import numpy as np
+
 FieldIds = Enum(
     "FieldIds",
     [
@@ -41,6 +43,17 @@ DOMAIN_HEADERS = [
     "structure",
 ]
 
+SUBDOMAIN_MAPPING = {
+    "discipleship": ["education", "training"],
+    "sending": ["sending1", "membercare"],
+    "support": ["praying", "giving", "community"],
+    "structure": ["organisation", "policies", "partnerships"],
+}
+
+AGGREGATE_HEADERS = DOMAIN_HEADERS + [
+    subdomain for subdomains in SUBDOMAIN_MAPPING.values() for subdomain in subdomains
+]
+
 DISPLAY_NAMES = {
     "discipleship": "Discipleship",
     "sending": "Sending",
@@ -59,6 +72,13 @@ DISPLAY_NAMES = {
 }
 
 
+ANSWER_HEADERS = [field.name for field in FieldIds]
+
+SCORE_HEADERS = [
+    header for header in CSV_HEADERS if header not in ["submitted_at", *ANSWER_HEADERS]
+]
+
+
 def convertFromUpon25To100(scoreUpon25):
     return (scoreUpon25 / 25) * 100
 
@@ -127,6 +147,7 @@ class FormResponse:
         return args_for_scores
 
     def __init__(self, raw_response):
+        self.response_id = raw_response.get("response_id") or raw_response.get("token")
         self.submitted_at = raw_response["submitted_at"]
 
         # Form response answers
@@ -169,3 +190,53 @@ class FormResponse:
             "score": self.scores.score,
             "finalpercentage": self.scores.finalpercentage,
         }
+
+
+# Lookups used by the batch parser, computed once instead of per answer.
+_ANSWER_COLUMN_BY_FIELD_ID = {field.value: field.name for field in FieldIds}
+_SCORE_INDEX = {header: index for index, header in enumerate(SCORE_HEADERS)}
+_DOMAIN_SCORE_INDICES = [_SCORE_INDEX[header] for header in DOMAIN_HEADERS]
+
+
+def parse_responses_to_columns(raw_responses):
+    """
+    Parse a page of raw Typeform responses straight into column arrays.
+
+    Produces the same values as FormResponse(...).parse_to_row() for each
+    item, but without building per-item objects. Returns a dict mapping
+    "response_id" and every CSV header to a NumPy array; missing scores are
+    NaN and missing answers are None.
+    """
+    count = len(raw_responses)
+    response_ids = np.empty(count, dtype=object)
+    submitted_at = np.empty(count, dtype=object)
+    answers = {header: np.full(count, None, dtype=object) for header in ANSWER_HEADERS}
+    scores = np.full((count, len(SCORE_HEADERS)), np.nan)
+
+    for row, raw_response in enumerate(raw_responses):
+        response_ids[row] = raw_response.get("response_id") or raw_response.get("token")
+        submitted_at[row] = raw_response["submitted_at"]
+
+        for answer in raw_response["answers"]:
+            column = _ANSWER_COLUMN_BY_FIELD_ID.get(answer["field"]["id"])
+            if column is not None:
+                answers[column][row] = (
+                    answer.get("text")
+                    if answer["type"] == "text"
+                    else answer.get("email")
+                )
+
+        for variable in raw_response["variables"]:
+            index = _SCORE_INDEX.get(variable["key"])
+            if index is not None and variable.get("number") is not None:
+                scores[row, index] = variable["number"]
+
+    scores[:, _DOMAIN_SCORE_INDICES] = convertFromUpon25To100(
+        scores[:, _DOMAIN_SCORE_INDICES]
+    )
+
+    columns = {"response_id": response_ids, "submitted_at": submitted_at}
+    columns.update(answers)
+    for header, index in _SCORE_INDEX.items():
+        columns[header] = scores[:, index]
+    return {header: columns[header] for header in ["response_id", *CSV_HEADERS]}
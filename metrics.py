@@ -0,0 +1,202 @@
+from dataclasses import dataclass
+
+import pandas as pd
+import streamlit as st
+
+from instrumentation import STAGE_SECONDS
+from interfaces.form_response import (
+    AGGREGATE_HEADERS,
+    DISPLAY_NAMES,
+    DOMAIN_HEADERS,
+    SUBDOMAIN_MAPPING,
+)
+from response_store import (
+    MAX_TIMESTAMP,
+    MIN_TIMESTAMP,
+    TIMESTAMP_FORMAT,
+    ResponseStore,
+)
+from rollups import ROLLUP_VALUES, RollupSummary, aggregate_rows
+from shared_dataset import select_role
+
+
+@dataclass(frozen=True)
+class CohortMetrics:
+    """Every domain and subdomain statistic the dashboard renders for a cohort."""
+
+    response_count: int
+    # Unrounded mean of every domain and subdomain score column
+    score_means: pd.Series
+    # avg_score / median_score per domain that has scores, indexed by domain
+    domain_summary_stats: pd.DataFrame
+    # Domain summary table, ready for display
+    domain_summary: pd.DataFrame
+    # One row per subdomain in SUBDOMAIN_MAPPING order: domain, subdomain,
+    # subdomain_full (display names), mean and avg_score (rounded)
+    subdomain_scores: pd.DataFrame
+    # (display name, avg_score) of the three strongest and weakest subdomains
+    strongest_subdomains: list
+    weakest_subdomains: list
+
+
+@STAGE_SECONDS.labels("cohort_metrics").time()
+def compute_cohort_metrics(df) -> CohortMetrics:
+    """
+    Compute all domain and subdomain statistics for an already filtered
+    cohort in one pass.
+    """
+    return _build_cohort_metrics(
+        len(df), df[AGGREGATE_HEADERS].mean(), df[DOMAIN_HEADERS].median()
+    )
+
+
+@STAGE_SECONDS.labels("range_metrics").time()
+def compute_range_metrics(summary) -> CohortMetrics:
+    """Build cohort metrics from a RollupSummary instead of raw rows."""
+    return _build_cohort_metrics(
+        summary.response_count, summary.score_means, summary.domain_medians
+    )
+
+
+def _build_cohort_metrics(response_count, score_means, domain_medians):
+    score_means = score_means.astype(float)
+
+    domain_summary_stats = (
+        pd.DataFrame(
+            {
+                "avg_score": score_means[DOMAIN_HEADERS],
+                "median_score": domain_medians.astype(float),
+            }
+        )
+        # Leave out domains without any scores
+        .dropna(subset=["avg_score"])
+        .sort_index()
+        .round(2)
+    )
+    domain_summary_stats.index.name = "domain"
+
+    domains = domain_summary_stats.index
+    domain_summary = pd.DataFrame(
+        {
+            "Domain": [DISPLAY_NAMES[domain] for domain in domains],
+            "Average Score": domain_summary_stats["avg_score"],
+            "Median Score": domain_summary_stats["median_score"],
+            "Top Subdomain": [
+                DISPLAY_NAMES[score_means[SUBDOMAIN_MAPPING[domain]].idxmax()]
+                for domain in domains
+            ],
+            "Lowest Subdomain": [
+                DISPLAY_NAMES[score_means[SUBDOMAIN_MAPPING[domain]].idxmin()]
+                for domain in domains
+            ],
+        }
+    ).reset_index(drop=True)
+
+    subdomain_scores = pd.DataFrame(
+        [
+            {
+                "domain": DISPLAY_NAMES[domain],
+                "subdomain": DISPLAY_NAMES[subdomain],
+                "subdomain_full": f"{DISPLAY_NAMES[domain]}: {DISPLAY_NAMES[subdomain]}",
+                "mean": score_means[subdomain],
+            }
+            for domain, subdomains in SUBDOMAIN_MAPPING.items()
+            for subdomain in subdomains
+        ]
+    )
+    subdomain_scores["avg_score"] = subdomain_scores["mean"].round(2)
+
+    ranked = subdomain_scores[["subdomain", "avg_score"]]
+    return CohortMetrics(
+        response_count=response_count,
+        score_means=score_means,
+        domain_summary_stats=domain_summary_stats,
+        domain_summary=domain_summary,
+        subdomain_scores=subdomain_scores,
+        strongest_subdomains=list(
+            ranked.nlargest(3, "avg_score").itertuples(index=False, name=None)
+        ),
+        weakest_subdomains=list(
+            ranked.nsmallest(3, "avg_score").itertuples(index=False, name=None)
+        ),
+    )
+
+
+@st.cache_resource(max_entries=32)
+def get_cohort_metrics(
+    dataset_key, role_filter, _load, _summary=None
+) -> CohortMetrics:
+    """
+    Memoized cohort metrics of the rows matching role_filter of the table
+    returned by _load. dataset_key must identify the exact rows of that
+    table (e.g. dataset version and byte offset); the function is not
+    hashed. When the rows' RollupSummary is already known (e.g. from the
+    live aggregate engine), pass it as _summary and the rows aren't loaded
+    at all. The returned object is shared between sessions and must not be
+    mutated.
+    """
+    if _summary is not None:
+        return compute_range_metrics(_summary)
+    return compute_cohort_metrics(select_role(_load(), role_filter).to_pandas())
+
+
+def _live_summary(table, after, since, until, role_filter, church_filter):
+    """
+    Summarise the rows of a live table submitted within [since, until] and
+    after `after`, matching the same filters as ResponseStore.rollup_summary.
+    """
+    frame = select_role(table, role_filter).to_pandas()
+    submitted_at = frame["submitted_at"].dt.strftime(TIMESTAMP_FORMAT)
+    frame = frame.assign(
+        submitted_at=submitted_at,
+        role=frame["role"].astype(object),
+        church=frame["church"].astype(object),
+    )
+    selected = (
+        (submitted_at > (after or MIN_TIMESTAMP))
+        & (submitted_at >= (since or MIN_TIMESTAMP))
+        & (submitted_at <= (until or MAX_TIMESTAMP))
+    )
+    if church_filter is not None:
+        selected &= frame["church"].fillna("") == church_filter
+    return RollupSummary.from_rollups(aggregate_rows(frame[selected])[ROLLUP_VALUES])
+
+
+@st.cache_resource(max_entries=32)
+def get_range_metrics(
+    store_version,
+    form_id,
+    since,
+    until,
+    role_filter,
+    church_filter=None,
+    live_key=None,
+    _live_table=None,
+) -> CohortMetrics:
+    """
+    Memoized cohort metrics for a submitted_at range of the response store,
+    answered from its rollups. store_version must be the store's
+    current dataset version so that new ingests invalidate the entry.
+
+    Rows received live (e.g. by webhook) can be included by passing their
+    table as _live_table and a live_key identifying its exact rows. Only
+    live rows submitted after the newest stored response are counted, so
+    responses that were also synced into the store aren't counted twice.
+    """
+    with STAGE_SECONDS.labels("rollup_summary").time():
+        store = ResponseStore()
+        summary = store.rollup_summary(
+            form_id, since, until, role_filter, church_filter
+        )
+        if _live_table is not None:
+            summary = summary.merge(
+                _live_summary(
+                    _live_table,
+                    store.latest_submitted_at(form_id),
+                    since,
+                    until,
+                    role_filter,
+                    church_filter,
+                )
+            )
+    return compute_range_metrics(summary)
@@ -0,0 +1,134 @@
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from dataset_loader import table_from_columns
+from instrumentation import ROWS_WRITTEN, STAGE_SECONDS
+
+CHECKPOINT_FILE = "_checkpoint.json"
+
+# Rows buffered before they are written out as one file per month
+PARQUET_FLUSH_ROWS = int(os.getenv("PARQUET_FLUSH_ROWS", "100000"))
+
+_write_seconds = STAGE_SECONDS.labels("parquet_write")
+_rows_written = ROWS_WRITTEN.labels("parquet")
+
+
+class PartitionedParquetWriter:
+    """
+    Writes pages of responses into Parquet files partitioned by the month
+    they were submitted in, as output_dir/month=YYYY-MM/part-NNNNNN.parquet,
+    so readers can skip the months they don't need.
+
+    After every flush a checkpoint records the position of the last page
+    written (as given to add_page), along with the bounds the export pinned
+    its range to when it started. Opening a writer on the same directory and range
+    resumes from it. A crash between writing files and saving the
+    checkpoint is harmless: the same pages are fetched again and rewritten
+    under the same part numbers.
+    """
+
+    def __init__(
+        self, output_dir, form_id, since, until, flush_rows=PARQUET_FLUSH_ROWS
+    ):
+        self.output_dir = output_dir
+        self.flush_rows = flush_rows
+        self._checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+        self._range = {"form_id": form_id, "since": since, "until": until}
+
+        checkpoint = self._read_checkpoint()
+        if checkpoint is not None and checkpoint["range"] != self._range:
+            raise ValueError(
+                f"{output_dir} holds an export of {checkpoint['range']}, "
+                f"not {self._range}; use another directory or start over"
+            )
+        checkpoint = checkpoint or {}
+        self.after = checkpoint.get("after")
+        self.rows = checkpoint.get("rows", 0)
+        self.partition = checkpoint.get("partition")
+        # [since, until] as actually fetched, e.g. with an open end fixed to
+        # the time the export started; None until the export has started
+        self.bounds = checkpoint.get("bounds")
+        self.complete = checkpoint.get("complete", False)
+        self._next_part = checkpoint.get("next_part", 0)
+
+        self._pending = []
+        self._pending_rows = 0
+        self._pending_after = self.after
+
+    def add_page(self, columns, after):
+        """
+        Buffer a page of parsed columns. after is the position to resume from
+        once the page is written, e.g. the API's `after` token; it must be
+        JSON serializable.
+        """
+        table = table_from_columns(columns)
+        self._pending.append(
+            table.add_column(0, "response_id", pa.array(columns["response_id"]))
+        )
+        self._pending_rows += table.num_rows
+        self._pending_after = after
+        if self._pending_rows >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows out, one file per month, and checkpoint."""
+        if self._pending:
+            with _write_seconds.time():
+                table = pa.concat_tables(self._pending)
+                months = pc.strftime(table["submitted_at"], format="%Y-%m")
+                for month in pc.unique(months).to_pylist():
+                    self.partition = month or "unknown"
+                    rows = table.filter(
+                        pc.is_null(months) if month is None else pc.equal(months, month)
+                    )
+                    self._write_part(rows)
+            self.rows += table.num_rows
+            _rows_written.inc(table.num_rows)
+            self._pending = []
+            self._pending_rows = 0
+        self.after = self._pending_after
+        self._write_checkpoint()
+
+    def finish(self):
+        """Flush and mark the export complete."""
+        self.complete = True
+        self.flush()
+
+    def _write_part(self, table):
+        directory = os.path.join(self.output_dir, f"month={self.partition}")
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{self._next_part:06d}.parquet"
+        path = os.path.join(directory, name)
+        # Write to a temporary file first so readers never see a partial part.
+        # Parquet readers skip files starting with "." or "_".
+        temp_path = os.path.join(directory, f".{name}.tmp")
+        pq.write_table(table, temp_path)
+        os.replace(temp_path, path)
+        self._next_part += 1
+
+    def _read_checkpoint(self):
+        try:
+            with open(self._checkpoint_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_checkpoint(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        checkpoint = {
+            "range": self._range,
+            "bounds": self.bounds,
+            "after": self.after,
+            "rows": self.rows,
+            "partition": self.partition,
+            "next_part": self._next_part,
+            "complete": self.complete,
+        }
+        temp_path = f"{self._checkpoint_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(temp_path, self._checkpoint_path)
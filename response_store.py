@@ -0,0 +1,443 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import repeat
+
+import pandas as pd
+import pyarrow as pa
+
+from constants import ALL_ROLES_OPTION, EMPTY_ROLE_OPTION, RESPONSE_STORE_FILE
+from dataset_loader import table_from_rows
+from dataset_version import bookkeeping, changing
+from interfaces.form_response import CSV_HEADERS
+from rollups import (
+    DAY_BUCKET_LENGTH,
+    HOUR_BUCKET_LENGTH,
+    ROLLUP_HISTOGRAMS,
+    ROLLUP_KEYS,
+    ROLLUP_TOTALS,
+    ROLLUP_VALUES,
+    RollupSummary,
+    aggregate_rows,
+)
+
+# Sentinels used for open-ended ranges. Typeform timestamps are ISO 8601 UTC
+# strings ("2025-04-01T08:15:00Z"), which sort lexicographically.
+MIN_TIMESTAMP = "0000-01-01T00:00:00Z"
+MAX_TIMESTAMP = "9999-12-31T23:59:59Z"
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+STORE_COLUMNS = ["form_id", "response_id"] + CSV_HEADERS
+
+# Bumped whenever the rollups change shape; older stores rebuild them on open
+SCHEMA_VERSION = 2
+
+# Rollup tables by bucket length. Rows with church NULL cover every church,
+# so unfiltered ranges don't add up the churches one by one. Only the daily
+# rollups also keep a row per church; ranges filtered by church read the
+# days at either end from the raw responses instead.
+ROLLUP_TABLES = {HOUR_BUCKET_LENGTH: "rollups", DAY_BUCKET_LENGTH: "daily_rollups"}
+
+_ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    form_id TEXT NOT NULL,
+    {columns}
+);
+CREATE INDEX IF NOT EXISTS {table}_bucket ON {table} (form_id, bucket);
+CREATE INDEX IF NOT EXISTS {table}_church ON {table} (form_id, church, bucket);
+"""
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS responses (
+    form_id TEXT NOT NULL,
+    response_id TEXT NOT NULL,
+    {", ".join(CSV_HEADERS)},
+    PRIMARY KEY (form_id, response_id)
+);
+CREATE INDEX IF NOT EXISTS responses_submitted_at
+    ON responses (form_id, submitted_at);
+CREATE TABLE IF NOT EXISTS fetched_ranges (
+    form_id TEXT NOT NULL,
+    since TEXT NOT NULL,
+    until TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    form_id TEXT PRIMARY KEY,
+    watermark TEXT,
+    synced_at TEXT
+);
+""" + "".join(
+    _ROLLUP_SCHEMA.format(table=table, columns=", ".join(ROLLUP_KEYS + ROLLUP_VALUES))
+    for table in ROLLUP_TABLES.values()
+)
+
+
+def _full_buckets(since, until, length):
+    """
+    Return [first, end) such that every bucket of the given length (an hour
+    or a day) in it lies entirely within [since, until].
+    """
+
+    def truncate(moment):
+        moment = moment.replace(minute=0, second=0)
+        return moment.replace(hour=0) if length == DAY_BUCKET_LENGTH else moment
+
+    step = timedelta(days=1) if length == DAY_BUCKET_LENGTH else timedelta(hours=1)
+    first, end = "", "~"
+    if since:
+        moment = datetime.strptime(since, TIMESTAMP_FORMAT)
+        bucket = truncate(moment)
+        if bucket < moment:
+            bucket += step
+        first = bucket.strftime(TIMESTAMP_FORMAT)[:length]
+    if until:
+        moment = datetime.strptime(until, TIMESTAMP_FORMAT) + timedelta(seconds=1)
+        end = truncate(moment).strftime(TIMESTAMP_FORMAT)[:length]
+    return first, end
+
+
+def format_timestamp(value):
+    """Format a datetime the same way Typeform's since/until params expect."""
+    return value.strftime(TIMESTAMP_FORMAT) if value else None
+
+
+class ResponseStore:
+    """
+    Durable local copy of Typeform responses, keyed by (form id, response id).
+
+    Alongside the responses, the store remembers which submitted_at ranges have
+    already been fetched from Typeform, so callers only need to go to the API
+    for the parts of a range that are not covered yet.
+    """
+
+    def __init__(self, path=RESPONSE_STORE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            (version,) = conn.execute("PRAGMA user_version").fetchone()
+            if version < SCHEMA_VERSION:
+                # Hourly rollups from before the daily ones; rebuilt below
+                conn.execute("DROP TABLE IF EXISTS rollups")
+            conn.executescript(_SCHEMA)
+            if version < SCHEMA_VERSION:
+                for (form_id,) in conn.execute(
+                    "SELECT DISTINCT form_id FROM responses"
+                ).fetchall():
+                    days = conn.execute(
+                        f"SELECT DISTINCT substr(submitted_at, 1, {DAY_BUCKET_LENGTH}) "
+                        "FROM responses WHERE form_id = ? ORDER BY 1",
+                        (form_id,),
+                    ).fetchall()
+                    self._refresh_rollups(conn, form_id, [day for (day,) in days])
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @contextmanager
+    def _connect(self, checkpoint=False):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+            if checkpoint:
+                # Move the committed write from the log into the database
+                # now, while the caller holds the dataset version. Otherwise
+                # whichever connection closes last does it later, and the
+                # file change looks like one made outside this process.
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+
+    def upsert(self, form_id, columns):
+        """
+        Insert or replace parsed responses, given as the column arrays
+        returned by parse_responses_to_columns.
+        """
+        placeholders = ", ".join("?" for _ in STORE_COLUMNS)
+        values = list(
+            zip(
+                repeat(form_id),
+                *(columns[header].tolist() for header in STORE_COLUMNS[1:]),
+            )
+        )
+        if not values:
+            return 0
+        days = {
+            submitted_at[:DAY_BUCKET_LENGTH] for submitted_at in columns["submitted_at"]
+        }
+        with changing(self.path), self._lock, self._connect(checkpoint=True) as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO responses ({', '.join(STORE_COLUMNS)}) "
+                f"VALUES ({placeholders})",
+                values,
+            )
+            self._refresh_rollups(conn, form_id, sorted(days))
+        return len(values)
+
+    def _refresh_rollups(self, conn, form_id, days):
+        """
+        Recompute the hourly and daily rollup rows of the given days, which
+        must be sorted, from responses.
+        """
+        # Stay well below SQLite's limit on bound parameters
+        for start in range(0, len(days), 500):
+            chunk = days[start : start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            # The range lets the submitted_at index skip every other day
+            span = (chunk[0], f"{chunk[-1]}~")
+            in_days = f"substr({{}}, 1, {DAY_BUCKET_LENGTH}) IN ({placeholders})"
+            frame = pd.read_sql_query(
+                f"SELECT {', '.join(CSV_HEADERS)} FROM responses "
+                "WHERE form_id = ? AND submitted_at >= ? AND submitted_at < ? "
+                f"AND {in_days.format('submitted_at')}",
+                conn,
+                params=(form_id, *span, *chunk),
+            )
+            columns = ["form_id"] + ROLLUP_KEYS + ROLLUP_VALUES
+            for length, table in ROLLUP_TABLES.items():
+                conn.execute(
+                    f"DELETE FROM {table} WHERE form_id = ? AND bucket >= ? "
+                    f"AND bucket < ? AND {in_days.format('bucket')}",
+                    (form_id, *span, *chunk),
+                )
+                by_church = [False, True] if length == DAY_BUCKET_LENGTH else [False]
+                for by_church in by_church:
+                    rollup = aggregate_rows(frame, length, by_church)
+                    conn.executemany(
+                        f"INSERT INTO {table} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' for _ in columns)})",
+                        zip(
+                            repeat(form_id),
+                            *(rollup[column].tolist() for column in columns[1:]),
+                        ),
+                    )
+
+    def missing_ranges(self, form_id, since, until):
+        """Return the (since, until) sub-ranges not yet fetched from Typeform."""
+        since = since or MIN_TIMESTAMP
+        until = until or MAX_TIMESTAMP
+        with self._connect() as conn:
+            covered = conn.execute(
+                "SELECT since, until FROM fetched_ranges "
+                "WHERE form_id = ? AND until >= ? AND since <= ? ORDER BY since",
+                (form_id, since, until),
+            ).fetchall()
+
+        gaps = []
+        cursor = since
+        for covered_since, covered_until in covered:
+            if covered_since > cursor:
+                gaps.append((cursor, covered_since))
+            cursor = max(cursor, covered_until)
+            if cursor >= until:
+                break
+        if cursor < until:
+            gaps.append((cursor, until))
+
+        return [
+            (
+                None if gap_since == MIN_TIMESTAMP else gap_since,
+                None if gap_until == MAX_TIMESTAMP else gap_until,
+            )
+            for gap_since, gap_until in gaps
+        ]
+
+    def mark_fetched(self, form_id, since, until):
+        """Record that [since, until] has been fetched, merging overlapping ranges."""
+        since = since or MIN_TIMESTAMP
+        until = until or MAX_TIMESTAMP
+        with bookkeeping(self.path), self._lock, self._connect(checkpoint=True) as conn:
+            ranges = conn.execute(
+                "SELECT since, until FROM fetched_ranges WHERE form_id = ?",
+                (form_id,),
+            ).fetchall()
+            ranges.append((since, until))
+            ranges.sort()
+
+            merged = [list(ranges[0])]
+            for range_since, range_until in ranges[1:]:
+                if range_since <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], range_until)
+                else:
+                    merged.append([range_since, range_until])
+
+            conn.execute("DELETE FROM fetched_ranges WHERE form_id = ?", (form_id,))
+            conn.executemany(
+                "INSERT INTO fetched_ranges (form_id, since, until) VALUES (?, ?, ?)",
+                [(form_id, s, u) for s, u in merged],
+            )
+
+    def rollup_summary(
+        self,
+        form_id,
+        since=None,
+        until=None,
+        role_filter=ALL_ROLES_OPTION,
+        church_filter=None,
+    ) -> RollupSummary:
+        """
+        Summarise the scores submitted within [since, until] from the
+        rollups: whole days from the daily rollups, whole hours of the days
+        at either end from the hourly ones, and only the minutes at the very
+        ends from the raw responses, so the result matches a scan of the
+        range exactly. church_filter selects a single church ("" for none);
+        None selects all. Filtered by church, the days at either end are
+        read from the raw responses.
+        """
+        role_clause, role_params = "", ()
+        if role_filter == EMPTY_ROLE_OPTION:
+            role_clause = " AND coalesce(role, '') = ''"
+        elif role_filter != ALL_ROLES_OPTION:
+            role_clause, role_params = " AND role = ?", (role_filter,)
+
+        first_day, end_day = _full_buckets(since, until, DAY_BUCKET_LENGTH)
+        if church_filter is None:
+            first_hour, end_hour = _full_buckets(since, until, HOUR_BUCKET_LENGTH)
+        else:
+            # Hourly rollups aren't kept per church
+            first_hour, end_hour = first_day, end_day
+        # Bucket ranges per rollup table, and the submitted_at ranges outside
+        # any full hour. Day buckets sort just before their hours, so they
+        # also bound hour buckets.
+        spans = {DAY_BUCKET_LENGTH: [], HOUR_BUCKET_LENGTH: []}
+        edges = [("", "~")]
+        if first_hour < end_hour:
+            edges = [("", first_hour), (end_hour, "~")]
+            if first_day < end_day:
+                spans[DAY_BUCKET_LENGTH] = [(first_day, end_day)]
+                spans[HOUR_BUCKET_LENGTH] = [
+                    (first_hour, first_day),
+                    (end_day, end_hour),
+                ]
+            else:
+                spans[HOUR_BUCKET_LENGTH] = [(first_hour, end_hour)]
+
+        summary = RollupSummary.from_totals([0] * len(ROLLUP_TOTALS), [])
+        with self._connect() as conn:
+            for length, bucket_spans in spans.items():
+                for bucket_from, bucket_to in bucket_spans:
+                    if bucket_from >= bucket_to:
+                        continue
+                    where = (
+                        f"FROM {ROLLUP_TABLES[length]} WHERE form_id = ? "
+                        "AND church IS ? AND bucket >= ? AND bucket < ?"
+                        f"{role_clause}"
+                    )
+                    params = (
+                        form_id,
+                        church_filter,
+                        bucket_from,
+                        bucket_to,
+                        *role_params,
+                    )
+                    totals = conn.execute(
+                        f"SELECT {', '.join(f'total({c})' for c in ROLLUP_TOTALS)} "
+                        f"{where}",
+                        params,
+                    ).fetchone()
+                    histograms = conn.execute(
+                        f"SELECT {', '.join(ROLLUP_HISTOGRAMS)} {where}", params
+                    ).fetchall()
+                    summary = summary.merge(
+                        RollupSummary.from_totals(totals, histograms)
+                    )
+
+            church_clause, church_params = "", ()
+            if church_filter is not None:
+                church_clause, church_params = " AND coalesce(church, '') = ?", (
+                    church_filter,
+                )
+            since, until = since or MIN_TIMESTAMP, until or MAX_TIMESTAMP
+            for edge_from, edge_to in edges:
+                frame = pd.read_sql_query(
+                    f"SELECT {', '.join(CSV_HEADERS)} FROM responses "
+                    "WHERE form_id = ? AND submitted_at >= ? AND submitted_at <= ? "
+                    "AND submitted_at >= ? AND submitted_at < ?"
+                    f"{role_clause}{church_clause}",
+                    conn,
+                    params=(
+                        form_id,
+                        since,
+                        until,
+                        edge_from,
+                        edge_to,
+                        *role_params,
+                        *church_params,
+                    ),
+                )
+                if len(frame):
+                    summary = summary.merge(
+                        RollupSummary.from_rollups(aggregate_rows(frame))
+                    )
+        return summary
+
+    def roles(self, form_id, since=None, until=None):
+        """
+        Return the non-empty roles of the responses submitted on the days
+        [since, until] overlaps, in order of first appearance, from the
+        daily rollups.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT role FROM daily_rollups WHERE form_id = ? AND church IS NULL "
+                "AND bucket >= ? AND bucket <= ? AND role != '' "
+                "GROUP BY role ORDER BY min(bucket), role",
+                (
+                    form_id,
+                    (since or MIN_TIMESTAMP)[:DAY_BUCKET_LENGTH],
+                    (until or MAX_TIMESTAMP)[:DAY_BUCKET_LENGTH],
+                ),
+            ).fetchall()
+        return [role for (role,) in rows]
+
+    def latest_submitted_at(self, form_id):
+        """Return the submitted_at of the newest stored response, if any."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT max(submitted_at) FROM responses WHERE form_id = ?",
+                (form_id,),
+            ).fetchone()[0]
+
+    def latest_rowid(self):
+        """
+        Return the rowid of the most recently inserted or replaced response.
+        It grows with every upsert, whichever process made it.
+        """
+        with self._connect() as conn:
+            return conn.execute("SELECT max(rowid) FROM responses").fetchone()[0]
+
+    def get_watermark(self, form_id):
+        """Return the latest submitted_at seen by an incremental sync, if any."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT watermark FROM sync_state WHERE form_id = ?", (form_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, form_id, watermark, synced_at):
+        with bookkeeping(self.path), self._connect(checkpoint=True) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (form_id, watermark, synced_at) "
+                "VALUES (?, ?, ?)",
+                (form_id, watermark, synced_at),
+            )
+
+    def read_table(self, form_id, since=None, until=None):
+        """Return the stored responses within [since, until] as a typed table."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"SELECT {', '.join(CSV_HEADERS)} FROM responses "
+                "WHERE form_id = ? AND submitted_at >= ? AND submitted_at <= ? "
+                "ORDER BY submitted_at",
+                (form_id, since or MIN_TIMESTAMP, until or MAX_TIMESTAMP),
+            )
+            tables = []
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                tables.append(table_from_rows(rows))
+        if not tables:
+            return table_from_rows([])
+        return pa.concat_tables(tables)
@@ -0,0 +1,134 @@
+import csv
+import os
+import threading
+import time
+
+from aggregates import get_aggregate_engine
+from constants import CSV_FILE
+from dataset_version import changing
+from instrumentation import ROWS_WRITTEN, STAGE_SECONDS
+from interfaces.form_response import CSV_HEADERS
+
+# "flush" hands each batch to the OS; "fsync" also forces it to disk before
+# the batch is considered committed.
+DURABILITY_MODES = ("flush", "fsync")
+
+WRITER_DURABILITY = os.getenv("RESPONSE_WRITER_DURABILITY", "flush")
+WRITER_MAX_BATCH_ROWS = int(os.getenv("RESPONSE_WRITER_MAX_BATCH_ROWS", "100"))
+WRITER_MAX_BATCH_DELAY = float(os.getenv("RESPONSE_WRITER_MAX_BATCH_DELAY", "0.5"))
+
+_append_seconds = STAGE_SECONDS.labels("csv_append")
+
+
+class ResponseWriter:
+    """
+    Owns an output CSV file and appends rows to it with group commit. Every
+    committed batch is also added to the file's aggregate engine.
+
+    Rows are buffered in memory and written as one batch once max_batch_rows
+    are waiting or max_batch_delay seconds have passed, whichever comes
+    first. All methods are safe to call from concurrent request handlers.
+    """
+
+    def __init__(
+        self,
+        path,
+        max_batch_rows=WRITER_MAX_BATCH_ROWS,
+        max_batch_delay=WRITER_MAX_BATCH_DELAY,
+        durability=WRITER_DURABILITY,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(
+                f"Unknown durability mode {durability!r}, "
+                f"expected one of {DURABILITY_MODES}"
+            )
+        self.path = path
+        self.max_batch_rows = max_batch_rows
+        self.max_batch_delay = max_batch_delay
+        self.durability = durability
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._file = None
+        self._writer = None
+        self._rows_written = ROWS_WRITTEN.labels(os.path.basename(path))
+
+        flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        flusher.start()
+
+    def write(self, row):
+        """Buffer a row dict keyed by CSV_HEADERS."""
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.max_batch_rows:
+                self._flush_locked()
+
+    def write_many(self, rows):
+        """
+        Append a batch of row dicts and write them out in one go, together
+        with anything already buffered.
+        """
+        with self._lock:
+            self._buffer.extend(rows)
+            self._flush_locked()
+
+    def flush(self):
+        """Write out every buffered row now."""
+        with self._lock:
+            self._flush_locked()
+
+    def reset(self):
+        """Drop buffered rows and truncate the file down to the CSV header."""
+        with self._lock:
+            self._buffer.clear()
+            self._close_locked()
+            with changing(self.path, rewritten=True) as version:
+                with open(self.path, "w", newline="") as csvfile:
+                    csv.DictWriter(csvfile, fieldnames=CSV_HEADERS).writeheader()
+                get_aggregate_engine(self.path).reset(version)
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        with changing(self.path) as version:
+            with _append_seconds.time():
+                if self._file is None:
+                    self._open_locked()
+                self._writer.writerows(self._buffer)
+                self._file.flush()
+                if self.durability == "fsync":
+                    os.fsync(self._file.fileno())
+            # Under the same lock as the version bump, so the engine's
+            # averages always match a version of the file
+            get_aggregate_engine(self.path).add_rows(self._buffer, version)
+        self._rows_written.inc(len(self._buffer))
+        self._buffer.clear()
+
+    def _open_locked(self):
+        self._file = open(self.path, "a", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=CSV_HEADERS)
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+
+    def _close_locked(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.max_batch_delay)
+            self.flush()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_response_writer(path=CSV_FILE):
+    """Return the process-wide writer that owns the given CSV file."""
+    with _writers_lock:
+        if path not in _writers:
+            _writers[path] = ResponseWriter(path)
+        return _writers[path]
@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from interfaces.form_response import AGGREGATE_HEADERS, DOMAIN_HEADERS
+
+# Buckets are a prefix of submitted_at: the hour ("2025-04-01T08") in the
+# hourly rollups and the day ("2025-04-01") in the daily ones
+HOUR_BUCKET_LENGTH = len("YYYY-MM-DDTHH")
+DAY_BUCKET_LENGTH = len("YYYY-MM-DD")
+
+# Domain scores are 0-100, so a histogram of whole points serves as the
+# per-bucket median sketch.
+HISTOGRAM_BINS = 101
+
+ROLLUP_KEYS = ["bucket", "role", "church"]
+# Columns that are summed across buckets in SQL
+ROLLUP_TOTALS = (
+    ["response_count"]
+    + [f"{header}_count" for header in AGGREGATE_HEADERS]
+    + [f"{header}_sum" for header in AGGREGATE_HEADERS]
+)
+ROLLUP_HISTOGRAMS = [f"{header}_histogram" for header in DOMAIN_HEADERS]
+ROLLUP_VALUES = ROLLUP_TOTALS + ROLLUP_HISTOGRAMS
+
+
+def aggregate_rows(
+    frame, bucket_length=HOUR_BUCKET_LENGTH, by_church=True
+) -> pd.DataFrame:
+    """
+    Roll raw response rows up into one row per (bucket, role, church), with
+    the columns of the rollups tables. Buckets are the first bucket_length
+    characters of submitted_at. Without by_church, the rows of all churches
+    are rolled up together and church is None. Histograms are returned as
+    bytes.
+    """
+    frame = frame.assign(
+        bucket=frame["submitted_at"].str.slice(0, bucket_length),
+        role=frame["role"].fillna(""),
+        church=frame["church"].fillna("") if by_church else "",
+    )
+    scores = frame[AGGREGATE_HEADERS].astype(float)
+    scores[ROLLUP_KEYS] = frame[ROLLUP_KEYS]
+    grouped = scores.groupby(ROLLUP_KEYS)
+    group_ids = grouped.ngroup().to_numpy()
+
+    histograms = {}
+    for header in DOMAIN_HEADERS:
+        values = scores[header].to_numpy()
+        present = ~np.isnan(values)
+        bins = np.clip(np.rint(values[present]), 0, 100).astype(int)
+        histogram = np.zeros((grouped.ngroups, HISTOGRAM_BINS), dtype=np.int32)
+        np.add.at(histogram, (group_ids[present], bins), 1)
+        histograms[f"{header}_histogram"] = [row.tobytes() for row in histogram]
+
+    rollup = pd.concat(
+        [
+            grouped.size().rename("response_count"),
+            grouped.count().add_suffix("_count"),
+            grouped.sum().add_suffix("_sum"),
+        ],
+        axis=1,
+    )
+    rollup = rollup.assign(**histograms).reset_index()
+    if not by_church:
+        rollup["church"] = None
+    return rollup[ROLLUP_KEYS + ROLLUP_VALUES]
+
+
+def _histogram_median(histogram):
+    total = histogram.sum()
+    if total == 0:
+        return np.nan
+    cumulative = np.cumsum(histogram)
+
+    def nth(n):
+        return np.searchsorted(cumulative, n + 1)
+
+    if total % 2:
+        return float(nth(total // 2))
+    return (nth(total // 2 - 1) + nth(total // 2)) / 2
+
+
+@dataclass(frozen=True)
+class RollupSummary:
+    """Score totals for a range, summed from rollup rows."""
+
+    response_count: int
+    counts: pd.Series
+    sums: pd.Series
+    histograms: dict
+
+    @classmethod
+    def from_totals(cls, totals, histogram_rows):
+        """
+        Build a summary from the sums of ROLLUP_TOTALS, in that order, and
+        the ROLLUP_HISTOGRAMS of every bucket summed over, as rows of bytes.
+        """
+        counts = len(AGGREGATE_HEADERS)
+        columns = list(zip(*histogram_rows)) or [()] * len(DOMAIN_HEADERS)
+        return cls(
+            response_count=int(totals[0]),
+            counts=pd.Series(
+                np.asarray(totals[1 : 1 + counts], dtype=float).astype(int),
+                index=AGGREGATE_HEADERS,
+            ),
+            sums=pd.Series(
+                np.asarray(totals[1 + counts :], dtype=float), index=AGGREGATE_HEADERS
+            ),
+            histograms={
+                header: np.frombuffer(b"".join(column), dtype=np.int32)
+                .reshape(-1, HISTOGRAM_BINS)
+                .sum(axis=0, dtype=np.int64)
+                for header, column in zip(DOMAIN_HEADERS, columns)
+            },
+        )
+
+    @classmethod
+    def from_rollups(cls, rollups):
+        return cls.from_totals(
+            rollups[ROLLUP_TOTALS].sum().tolist(),
+            rollups[ROLLUP_HISTOGRAMS].itertuples(index=False, name=None),
+        )
+
+    def merge(self, other) -> "RollupSummary":
+        """Summarise the responses of both summaries together."""
+        return RollupSummary(
+            response_count=self.response_count + other.response_count,
+            counts=self.counts + other.counts,
+            sums=self.sums + other.sums,
+            histograms={
+                header: self.histograms[header] + other.histograms[header]
+                for header in DOMAIN_HEADERS
+            },
+        )
+
+    @property
+    def score_means(self) -> pd.Series:
+        return self.sums / self.counts.where(self.counts > 0)
+
+    @property
+    def domain_medians(self) -> pd.Series:
+        return pd.Series(
+            [_histogram_median(self.histograms[h]) for h in DOMAIN_HEADERS],
+            index=DOMAIN_HEADERS,
+        )
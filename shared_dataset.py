@@ -0,0 +1,118 @@
+import threading
+from typing import NamedTuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+
+from constants import ALL_ROLES_OPTION, CSV_FILE, EMPTY_ROLE_OPTION
+from dataset_loader import load_table
+from dataset_version import DatasetVersion, get_dataset_version
+from response_store import ResponseStore
+
+
+class DatasetSnapshot(NamedTuple):
+    version: DatasetVersion
+    # Bytes of the CSV file contained in table
+    offset: int
+    table: pa.Table
+
+
+class SharedDataset:
+    """
+    The rows of one dataset file as a single, process-wide Arrow table.
+
+    Every session reads the same immutable table, so memory doesn't grow
+    with the number of viewers. The table is only reloaded when the
+    dataset version changes; if rows were only appended (e.g. by
+    webhooks), the new rows are read and added as a new chunk without
+    copying the existing ones.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def snapshot(self) -> DatasetSnapshot:
+        """Return the table for the file's current version."""
+        version = get_dataset_version(self.path)
+        # Sessions asking at the same time wait for one load instead of
+        # each reading the file.
+        with self._lock:
+            current = self._snapshot
+            if current is not None and current.version == version:
+                return current
+
+            if current is not None and current.version.generation == version.generation:
+                new_rows, consumed = load_table(self.path, current.offset)
+                table = current.table
+                if new_rows.num_rows:
+                    table = pa.concat_tables([table, new_rows])
+                offset = current.offset + consumed
+            else:
+                table, offset = load_table(self.path)
+
+            self._snapshot = DatasetSnapshot(version, offset, table)
+            return self._snapshot
+
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+
+def get_shared_dataset(path=CSV_FILE):
+    """Return the process-wide shared dataset for the given CSV file."""
+    with _datasets_lock:
+        if path not in _datasets:
+            _datasets[path] = SharedDataset(path)
+        return _datasets[path]
+
+
+def role_values(table):
+    """Distinct non-empty roles in order of first appearance."""
+    return [role for role in table["role"].unique().to_pylist() if role]
+
+
+def select_role(table, role_filter=ALL_ROLES_OPTION) -> pa.Table:
+    """Filter a table by role without copying unselected rows."""
+    if role_filter == ALL_ROLES_OPTION:
+        return table
+    if role_filter == EMPTY_ROLE_OPTION:
+        mask = pc.or_kleene(pc.is_null(table["role"]), pc.equal(table["role"], ""))
+    else:
+        mask = pc.equal(table["role"], role_filter)
+    return table.filter(pc.fill_null(mask, False))
+
+
+@st.cache_resource(max_entries=16)
+def get_range_table(store_version, form_id, since, until) -> pa.Table:
+    """
+    Read the stored responses within [since, until] once per store version
+    for all sessions, so each session gets the range it asked for without
+    sharing a file with sessions asking for other ranges.
+    """
+    return ResponseStore().read_table(form_id, since, until)
+
+
+@st.cache_resource(max_entries=16)
+def get_range_roles(store_version, form_id, since, until) -> list:
+    """
+    Distinct non-empty roles of the stored responses within [since, until],
+    from the store's rollups, once per store version. The returned list is
+    shared and must not be mutated.
+    """
+    return ResponseStore().roles(form_id, since, until)
+
+
+def append_newer(history, live):
+    """
+    Append the rows of live submitted after the last row of history, so
+    responses both synced into the store and received by webhook are only
+    counted once.
+    """
+    if not history.num_rows:
+        return live
+    latest = pc.max(history["submitted_at"])
+    newer = live.filter(pc.fill_null(pc.greater(live["submitted_at"], latest), False))
+    return pa.concat_tables([history, newer])
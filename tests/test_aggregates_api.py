@@ -0,0 +1,117 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.web import Application
+
+import api_server
+from constants import CSV_FILE
+from interfaces.form_response import FormResponse, parse_responses_to_columns
+from response_store import ResponseStore
+from response_writer import ResponseWriter
+from typeform_mock import SyntheticResponses
+
+FORM_ID = "form"
+
+# One response an hour on 1 and 2 January, in the store
+stored = SyntheticResponses(48, datetime(2025, 1, 1), datetime(2025, 1, 3), seed=2)
+# Received by webhook from the last stored hour on, so the first one was
+# also synced into the store
+live = SyntheticResponses(6, datetime(2025, 1, 2, 23), datetime(2025, 1, 3, 5), seed=3)
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(api_server, "FORM_ID", FORM_ID)
+    fills = []
+    monkeypatch.setattr(api_server, "fill_range", lambda *bounds: fills.append(bounds))
+    ResponseStore().upsert(
+        FORM_ID, parse_responses_to_columns([stored.item(i) for i in range(48)])
+    )
+
+    app = Application(
+        [(r"/api/aggregates/(domains|subdomains)", api_server.AggregatesHandler)]
+    )
+
+    def fetch(query, etag=None):
+        async def main():
+            sock, port = bind_unused_port()
+            server = HTTPServer(app)
+            server.add_sockets([sock])
+            try:
+                response = await AsyncHTTPClient().fetch(
+                    f"http://127.0.0.1:{port}/api/aggregates/{query}",
+                    headers={"If-None-Match": etag} if etag else None,
+                )
+            except HTTPClientError as e:
+                response = e.response
+            finally:
+                server.stop()
+            body = json.loads(response.body) if response.body else None
+            return response.code, response.headers.get("Etag"), body
+
+        return asyncio.run(main())
+
+    fetch.fills = fills
+    return fetch
+
+
+def _receive_live(indexes):
+    writer = ResponseWriter(CSV_FILE, max_batch_delay=3600)
+    writer.write_many([FormResponse(live.item(i)).parse_to_row() for i in indexes])
+
+
+def test_date_only_until_includes_the_whole_day(api):
+    code, _, body = api("domains?since=2025-01-02&until=2025-01-02")
+    assert code == 200
+    assert body["filters"]["since"] == "2025-01-02T00:00:00Z"
+    assert body["filters"]["until"] == "2025-01-02T23:59:59Z"
+    assert body["response_count"] == 24
+
+
+def test_missing_parts_of_past_ranges_are_fetched_first(api):
+    _, etag, _ = api("domains?since=2025-01-01&until=2025-01-02")
+    assert api.fills == [("2025-01-01T00:00:00Z", "2025-01-02T23:59:59Z")]
+
+    # A matching ETag is answered before looking for anything to fetch
+    assert api("domains?since=2025-01-01&until=2025-01-02", etag)[0] == 304
+    assert len(api.fills) == 1
+
+
+def test_open_ranges_are_answered_without_fetching(api):
+    for query in ("domains", "domains?since=2025-01-01", "domains?until=2025-01-02"):
+        assert api(query)[0] == 200
+    assert api("domains?since=2025-01-01&until=9999-01-01")[0] == 200
+    assert api.fills == []
+
+
+def test_live_rows_are_included_once(api):
+    _receive_live(range(6))
+    code, _, body = api("subdomains")
+    assert code == 200
+    # The first live response is already in the store
+    assert body["response_count"] == 48 + 5
+
+    code, _, body = api("subdomains?until=2025-01-03T02:00:00Z")
+    assert body["response_count"] == 48 + 3
+
+
+def test_etag_changes_with_live_rows(api):
+    _receive_live(range(3))
+    _, etag, _ = api("domains?role=All")
+    assert api("domains?role=All", etag)[0] == 304
+
+    _receive_live(range(3, 6))
+    code, new_etag, body = api("domains?role=All", etag)
+    assert code == 200
+    assert new_etag != etag
+    assert body["response_count"] == 48 + 5
+
+
+def test_invalid_bounds_are_rejected(api):
+    assert api("domains?since=yesterday")[0] == 400
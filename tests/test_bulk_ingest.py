@@ -0,0 +1,149 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.web import Application
+
+import api_server
+import bulk_ingest
+import response_writer
+import shared_dataset
+from bulk_ingest import EventStreamParser
+from constants import CSV_FILE, REALTIME_FLAG_FILE
+from response_store import ResponseStore
+from typeform_mock import SyntheticResponses
+
+responses = SyntheticResponses(5, datetime(2025, 1, 1), datetime(2025, 1, 2), seed=4)
+EVENTS = [responses.webhook_event(i) for i in range(5)]
+
+
+def _parse(body, chunk_size=None):
+    parser = EventStreamParser()
+    chunk_size = chunk_size or len(body) or 1
+    for start in range(0, len(body), chunk_size):
+        parser.feed(body[start : start + chunk_size])
+    parser.close()
+    return parser
+
+
+def _ndjson(events):
+    return b"".join(json.dumps(event).encode() + b"\n" for event in events)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 7, 4096])
+@pytest.mark.parametrize(
+    "body",
+    [_ndjson(EVENTS), json.dumps(EVENTS, indent=1).encode()],
+    ids=["ndjson", "array"],
+)
+def test_any_chunking_gives_the_same_rows(body, chunk_size):
+    parser = _parse(body, chunk_size)
+    assert parser.error is None
+    assert [result["status"] for result in parser.results] == ["accepted"] * 5
+    assert [row["submitted_at"] for row in parser.rows] == [
+        responses.submitted_at(i) for i in range(5)
+    ]
+
+
+def test_multibyte_characters_split_across_chunks():
+    event = dict(EVENTS[0], event_id="évènement")
+    parser = _parse(json.dumps(event, ensure_ascii=False).encode(), chunk_size=1)
+    assert parser.error is None
+    assert parser.results[0]["event_id"] == "évènement"
+
+
+def test_invalid_events_are_rejected_individually():
+    body = _ndjson(EVENTS[:1]) + b"{not json\n" + b'{"event_id": "x"}\n'
+    body += _ndjson(EVENTS[1:2])
+    parser = _parse(body)
+    assert [result["status"] for result in parser.results] == [
+        "accepted",
+        "rejected",
+        "rejected",
+        "accepted",
+    ]
+    assert parser.results[2]["event_id"] == "x"
+    assert len(parser.rows) == 2
+
+
+def test_a_last_line_without_newline_is_parsed():
+    parser = _parse(_ndjson(EVENTS[:2]).rstrip(b"\n"))
+    assert len(parser.rows) == 2
+
+
+def test_oversized_ndjson_line_is_dropped_without_buffering(monkeypatch):
+    limit = len(json.dumps(EVENTS[0])) + 100
+    monkeypatch.setattr(bulk_ingest, "BULK_MAX_EVENT_BYTES", limit)
+    parser = EventStreamParser()
+    parser.feed(_ndjson(EVENTS[:1]))
+    for _ in range(100):
+        parser.feed(b"x" * 64)
+        assert len(parser._buffer) <= limit
+    parser.feed(b"\n" + _ndjson(EVENTS[1:2]).rstrip(b"\n"))
+    parser.close()
+
+    assert parser.error is None
+    assert [result["status"] for result in parser.results] == [
+        "accepted",
+        "rejected",
+        "accepted",
+    ]
+    assert parser.results[1]["error"] == "event too large"
+    assert len(parser.rows) == 2
+
+
+def test_oversized_array_item_fails_the_body(monkeypatch):
+    monkeypatch.setattr(bulk_ingest, "BULK_MAX_EVENT_BYTES", 100)
+    parser = EventStreamParser()
+    parser.feed(b'[{"event_id": "' + b"x" * 200)
+    assert parser.error is not None
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        json.dumps(EVENTS).encode()[:-1],
+        json.dumps(EVENTS).encode()[:-20],
+        b"[",
+    ],
+    ids=["unclosed", "cut-in-item", "empty"],
+)
+def test_truncated_arrays_fail_the_body(body):
+    parser = _parse(body, chunk_size=16)
+    assert parser.error is not None
+
+
+def test_data_after_the_array_fails_the_body():
+    parser = _parse(json.dumps(EVENTS).encode() + b" {}")
+    assert parser.error == "unexpected data after the JSON array"
+
+
+def test_accepted_events_are_stored_and_appended_live(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(api_server, "FORM_ID", "form")
+    monkeypatch.setattr(response_writer, "_writers", {})
+    monkeypatch.setattr(shared_dataset, "_datasets", {})
+    open(REALTIME_FLAG_FILE, "w").close()
+    body = _ndjson(EVENTS[:3]) + b"{not json\n" + _ndjson(EVENTS[3:])
+
+    async def post():
+        sock, port = bind_unused_port()
+        server = HTTPServer(Application([(r"/bulk", api_server.BulkIngestHandler)]))
+        server.add_sockets([sock])
+        try:
+            response = await AsyncHTTPClient().fetch(
+                f"http://127.0.0.1:{port}/bulk", method="POST", body=body
+            )
+        finally:
+            server.stop()
+        return json.loads(response.body)
+
+    result = asyncio.run(post())
+    assert result["accepted"] == 5 and result["rejected"] == 1
+    stored = ResponseStore().read_table("form")["submitted_at"].to_pylist()
+    assert len(stored) == 5
+    assert shared_dataset.get_shared_dataset(CSV_FILE).snapshot().table.num_rows == 5
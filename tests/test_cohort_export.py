@@ -0,0 +1,82 @@
+import os
+from datetime import datetime
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+import cohort_export
+from cohort_export import find_cohort_export, get_cohort_export
+from constants import ALL_ROLES_OPTION
+from dataset_loader import table_from_columns
+from interfaces.form_response import parse_responses_to_columns
+from typeform_mock import SyntheticResponses
+
+responses = SyntheticResponses(30, datetime(2025, 1, 1), datetime(2025, 1, 2))
+TABLE = table_from_columns(
+    parse_responses_to_columns([responses.item(i) for i in range(30)])
+)
+
+
+def load_table():
+    return TABLE
+
+
+@pytest.fixture(autouse=True)
+def exports(monkeypatch):
+    monkeypatch.setattr(cohort_export, "EXPORT_CACHE_ENTRIES", 3)
+    monkeypatch.setattr(cohort_export, "_exports", cohort_export.OrderedDict())
+    monkeypatch.setattr(cohort_export, "_exports_by_token", {})
+
+
+def test_same_cohort_gets_the_same_export():
+    export = get_cohort_export("v1", ALL_ROLES_OPTION, load_table)
+    assert get_cohort_export("v1", ALL_ROLES_OPTION, load_table) is export
+    assert get_cohort_export("v2", ALL_ROLES_OPTION, load_table) is not export
+    assert find_cohort_export(export.token) is export
+
+
+def test_least_recently_used_export_is_evicted_with_its_files():
+    first = get_cohort_export("v1", ALL_ROLES_OPTION, load_table)
+    second = get_cohort_export("v2", ALL_ROLES_OPTION, load_table)
+    path = first.render("csv")
+    get_cohort_export("v3", ALL_ROLES_OPTION, load_table)
+    # Using an export again keeps it, as the refreshed live links do
+    get_cohort_export("v1", ALL_ROLES_OPTION, load_table)
+    get_cohort_export("v4", ALL_ROLES_OPTION, load_table)
+
+    assert find_cohort_export(first.token) is first
+    assert find_cohort_export(second.token) is None
+    get_cohort_export("v5", ALL_ROLES_OPTION, load_table)
+    get_cohort_export("v6", ALL_ROLES_OPTION, load_table)
+    assert find_cohort_export(first.token) is None
+    assert not os.path.exists(path)
+
+
+def test_every_format_holds_the_selected_rows():
+    role = TABLE["role"][0].as_py()
+    expected = sum(value == role for value in TABLE["role"].to_pylist())
+    export = get_cohort_export("v1", role, load_table)
+
+    assert len(pd.read_csv(export.render("csv"))) == expected
+    assert pq.read_table(export.render("parquet")).num_rows == expected
+    frame = pd.read_excel(export.render("xlsx"))
+    assert len(frame) == expected
+    assert list(frame.columns) == TABLE.column_names
+
+
+def test_excel_export_is_written_in_chunks(monkeypatch):
+    monkeypatch.setattr(cohort_export, "EXPORT_CHUNK_ROWS", 7)
+    frame = pd.read_excel(
+        get_cohort_export("v1", ALL_ROLES_OPTION, load_table).render("xlsx")
+    )
+    assert list(frame.columns) == TABLE.column_names
+    assert frame["respondent"].tolist() == TABLE["respondent"].to_pylist()
+    assert frame["score"].tolist() == TABLE["score"].to_pylist()
+
+
+def test_excel_export_refuses_too_many_rows(monkeypatch):
+    monkeypatch.setattr(cohort_export, "EXCEL_MAX_ROWS", 10)
+    export = get_cohort_export("v1", ALL_ROLES_OPTION, load_table)
+    with pytest.raises(ValueError):
+        export.render("xlsx")
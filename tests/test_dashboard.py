@@ -0,0 +1,121 @@
+import os
+from datetime import datetime
+
+import pytest
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit.testing.v1 import AppTest
+
+import api_server
+import response_writer
+import shared_dataset
+import typeform_api
+from constants import CSV_FILE
+from interfaces.form_response import FormResponse
+from typeform_mock import SyntheticResponses
+
+DASHBOARD = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dashboard.py")
+
+live = SyntheticResponses(20, datetime(2025, 1, 1), datetime(2025, 1, 2), seed=5)
+
+
+def _receive_live(indexes):
+    response_writer.get_response_writer(CSV_FILE).write_many(
+        [FormResponse(live.item(i)).parse_to_row() for i in indexes]
+    )
+
+
+class _Rerun(Exception):
+    pass
+
+
+class Fragments:
+    """
+    Records which fragments the dashboard runs. AppTest only runs whole
+    scripts, so fragments on a timer are run once more right after their
+    first run, as a live refresh would, with between_ticks called first.
+    """
+
+    def __init__(self, monkeypatch):
+        self.runs = []
+        self.timed = []
+        self.tick_reruns = 0
+        self.between_ticks = lambda: None
+        self._ticking = False
+        fragment, rerun = st.fragment, st.rerun
+
+        def record(func=None, *, run_every=None):
+            if func is None:
+                return lambda func: record(func, run_every=run_every)
+            if run_every:
+                self.timed.append(func.__name__)
+
+            def run(*args):
+                self.runs.append(func.__name__)
+                element_ids = get_script_run_ctx().widget_ids_this_run
+                ids_before = set(element_ids)
+                func(*args)
+                if run_every:
+                    # A rerun of the fragment alone forgets its elements
+                    element_ids.intersection_update(ids_before)
+                    self._tick(func, args)
+
+            run.__name__ = func.__name__
+            return fragment(run)
+
+        def record_rerun(*args, **kwargs):
+            if self._ticking:
+                raise _Rerun()
+            rerun(*args, **kwargs)
+
+        monkeypatch.setattr(st, "fragment", record)
+        monkeypatch.setattr(st, "rerun", record_rerun)
+
+    def _tick(self, func, args):
+        self.between_ticks()
+        self._ticking = True
+        try:
+            func(*args)
+        except _Rerun:
+            self.tick_reruns += 1
+        finally:
+            self._ticking = False
+
+
+@pytest.fixture
+def dashboard(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(api_server, "setup_api_handler", lambda *args: None)
+    monkeypatch.setattr(
+        typeform_api, "fetch_typeform_responses", lambda *args, **kwargs: None
+    )
+    monkeypatch.setattr(response_writer, "_writers", {})
+    monkeypatch.setattr(shared_dataset, "_datasets", {})
+
+    app = AppTest.from_file(DASHBOARD, default_timeout=60)
+    app.run()
+    app.toggle[0].set_value(True).run()
+    _receive_live(range(10))
+    app.fragments = Fragments(monkeypatch)
+    return app
+
+
+def test_only_the_cohort_panels_are_on_the_live_timer(dashboard):
+    dashboard.run()
+    fragments = dashboard.fragments
+    assert not dashboard.exception
+    assert fragments.timed == ["cohort_panels"]
+    assert sorted(fragments.runs) == [
+        "cohort_panels",
+        "comparison_section",
+        "export_section",
+    ]
+    # Nothing arrived since the page was rendered
+    assert fragments.tick_reruns == 0
+
+
+def test_new_live_rows_rerun_the_page_from_the_panels(dashboard):
+    dashboard.fragments.between_ticks = lambda: _receive_live(range(10, 20))
+    dashboard.run()
+    assert not dashboard.exception
+    assert dashboard.fragments.tick_reruns == 1
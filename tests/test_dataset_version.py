@@ -0,0 +1,38 @@
+import os
+
+from dataset_version import changing, get_dataset_version
+
+
+def test_changes_by_this_process_are_appends_or_rewrites(tmp_path):
+    path = str(tmp_path / "responses.csv")
+    with changing(path, rewritten=True) as expected:
+        with open(path, "w") as f:
+            f.write("header\n")
+    assert get_dataset_version(path)[:2] == expected[:2]
+
+    with changing(path) as appended:
+        with open(path, "a") as f:
+            f.write("row\n")
+    version = get_dataset_version(path)
+    assert version[:2] == appended[:2]
+    assert version.generation == expected.generation
+    assert version.revision == expected.revision + 1
+    assert get_dataset_version(path) == version
+
+
+def test_changes_by_another_process_count_as_rewrites(tmp_path):
+    path = str(tmp_path / "responses.csv")
+    with changing(path, rewritten=True):
+        with open(path, "w") as f:
+            f.write("header\n")
+    before = get_dataset_version(path)
+
+    # As if appended by another process: nothing recorded the change
+    with open(path, "a") as f:
+        f.write("row\n")
+    after = get_dataset_version(path)
+    assert after.generation == before.generation + 1
+    assert after.files != before.files
+
+    os.remove(path)
+    assert get_dataset_version(path).generation == after.generation + 1
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import pyarrow.parquet as pq
+import pytest
+
+from interfaces.form_response import parse_responses_to_columns
+from parquet_export import PartitionedParquetWriter
+from typeform_mock import SyntheticResponses
+
+# 100 responses from mid-January to mid-March, in pages of 10
+responses = SyntheticResponses(100, datetime(2025, 1, 15), datetime(2025, 3, 15))
+PAGES = [
+    (
+        parse_responses_to_columns(
+            [responses.item(i) for i in range(start, start + 10)]
+        ),
+        f"after-{start + 9}",
+    )
+    for start in range(0, 100, 10)
+]
+RANGE = ("form", None, "2025-03-31T23:59:59Z")
+
+
+def _page_after(token):
+    """Index of the page following the one that returned token."""
+    return 0 if token is None else int(token.split("-")[1]) // 10 + 1
+
+
+def _export(output_dir, stop_after=None):
+    """Feed pages from the checkpoint on, as export_history does."""
+    writer = PartitionedParquetWriter(str(output_dir), *RANGE, flush_rows=25)
+    for columns, after in PAGES[_page_after(writer.after) :]:
+        writer.add_page(columns, after)
+        if after == stop_after:
+            # Crash: whatever wasn't flushed yet is lost
+            return writer
+    writer.finish()
+    return writer
+
+
+def _response_ids(output_dir):
+    return pq.read_table(str(output_dir))["response_id"].to_pylist()
+
+
+def test_rows_are_partitioned_by_month(tmp_path):
+    writer = _export(tmp_path)
+    assert writer.complete and writer.rows == 100
+    months = sorted(path.name for path in tmp_path.glob("month=*"))
+    assert months == ["month=2025-01", "month=2025-02", "month=2025-03"]
+    table = pq.read_table(str(tmp_path / "month=2025-02"))
+    assert {value.month for value in table["submitted_at"].to_pylist()} == {2}
+
+
+def test_interrupted_export_resumes_from_the_checkpoint(tmp_path):
+    crashed = _export(tmp_path, stop_after="after-59")
+    # Flushed at 30 and 60 rows, so the checkpoint is at the crash
+    assert crashed.after == "after-59"
+    resumed = PartitionedParquetWriter(str(tmp_path), *RANGE, flush_rows=25)
+    assert resumed.after == "after-59" and resumed.rows == 60
+
+    writer = _export(tmp_path)
+    assert writer.complete and writer.rows == 100
+    ids = _response_ids(tmp_path)
+    assert sorted(ids) == [responses.token(i) for i in range(100)]
+
+
+def test_unflushed_pages_are_fetched_again(tmp_path):
+    _export(tmp_path, stop_after="after-69")
+    # Rows 60-69 weren't flushed, so the checkpoint still points before them
+    assert PartitionedParquetWriter(str(tmp_path), *RANGE).after == "after-59"
+    _export(tmp_path)
+    ids = _response_ids(tmp_path)
+    assert len(ids) == len(set(ids)) == 100
+
+
+def test_completed_export_is_not_redone(tmp_path):
+    _export(tmp_path)
+    writer = PartitionedParquetWriter(str(tmp_path), *RANGE)
+    assert writer.complete and writer.rows == 100
+
+
+def test_another_range_is_refused(tmp_path):
+    _export(tmp_path, stop_after="after-29")
+    with pytest.raises(ValueError):
+        PartitionedParquetWriter(str(tmp_path), "form", "2025-02-01T00:00:00Z", None)
@@ -0,0 +1,176 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+import typeform_api
+from constants import ALL_ROLES_OPTION
+from dataset_version import get_dataset_version
+from interfaces.form_response import DOMAIN_HEADERS, parse_responses_to_columns
+from response_store import ResponseStore, format_timestamp
+from typeform_mock import SyntheticResponses
+
+FORM_ID = "form"
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResponseStore(str(tmp_path / "responses.sqlite3"))
+
+
+def test_nothing_fetched_is_one_gap(store):
+    assert store.missing_ranges(FORM_ID, "2025-01-01T00:00:00Z", None) == [
+        ("2025-01-01T00:00:00Z", None)
+    ]
+
+
+def test_fetched_range_is_covered(store):
+    store.mark_fetched(FORM_ID, "2025-01-01T00:00:00Z", "2025-02-01T00:00:00Z")
+    assert (
+        store.missing_ranges(FORM_ID, "2025-01-10T00:00:00Z", "2025-01-20T00:00:00Z")
+        == []
+    )
+
+
+def test_gaps_around_and_between_fetched_ranges(store):
+    store.mark_fetched(FORM_ID, "2025-02-01T00:00:00Z", "2025-03-01T00:00:00Z")
+    store.mark_fetched(FORM_ID, "2025-04-01T00:00:00Z", "2025-05-01T00:00:00Z")
+    assert store.missing_ranges(FORM_ID, None, None) == [
+        (None, "2025-02-01T00:00:00Z"),
+        ("2025-03-01T00:00:00Z", "2025-04-01T00:00:00Z"),
+        ("2025-05-01T00:00:00Z", None),
+    ]
+
+
+def test_overlapping_ranges_are_merged(store):
+    store.mark_fetched(FORM_ID, "2025-01-01T00:00:00Z", "2025-02-01T00:00:00Z")
+    store.mark_fetched(FORM_ID, "2025-03-01T00:00:00Z", "2025-04-01T00:00:00Z")
+    store.mark_fetched(FORM_ID, "2025-01-15T00:00:00Z", "2025-03-15T00:00:00Z")
+    with store._connect() as conn:
+        ranges = conn.execute("SELECT since, until FROM fetched_ranges").fetchall()
+    assert ranges == [("2025-01-01T00:00:00Z", "2025-04-01T00:00:00Z")]
+
+
+def test_ranges_are_per_form(store):
+    store.mark_fetched("other", None, None)
+    assert store.missing_ranges(FORM_ID, None, "2025-01-01T00:00:00Z") == [
+        (None, "2025-01-01T00:00:00Z")
+    ]
+
+
+def test_fill_range_leaves_the_future_a_gap(store, monkeypatch):
+    monkeypatch.setattr(typeform_api, "FORM_ID", FORM_ID)
+    monkeypatch.setattr(typeform_api, "_store_range", lambda *args: (0, None))
+    before = format_timestamp(datetime.now(timezone.utc))
+
+    typeform_api._fill_range(store, "2025-01-01T00:00:00Z", "9000-01-01T00:00:00Z")
+
+    [(gap_since, gap_until)] = store.missing_ranges(
+        FORM_ID, "2025-01-01T00:00:00Z", "9000-01-01T00:00:00Z"
+    )
+    assert before <= gap_since < "9000"
+    assert gap_until == "9000-01-01T00:00:00Z"
+
+
+def test_fill_range_skips_ranges_entirely_in_the_future(store, monkeypatch):
+    monkeypatch.setattr(typeform_api, "FORM_ID", FORM_ID)
+    monkeypatch.setattr(typeform_api, "_store_range", lambda *args: (0, None))
+
+    typeform_api._fill_range(store, "8000-01-01T00:00:00Z", "9000-01-01T00:00:00Z")
+
+    assert store.missing_ranges(
+        FORM_ID, "8000-01-01T00:00:00Z", "9000-01-01T00:00:00Z"
+    ) == [("8000-01-01T00:00:00Z", "9000-01-01T00:00:00Z")]
+
+
+def test_rollup_summary_matches_a_scan_of_the_range(store):
+    responses = SyntheticResponses(
+        500, datetime(2025, 1, 1), datetime(2025, 1, 3), seed=1
+    )
+    columns = parse_responses_to_columns(
+        [responses.item(index) for index in range(responses.count)]
+    )
+    store.upsert(FORM_ID, columns)
+
+    # Starts and ends mid-hour, so both edges come from raw rows
+    since, until = "2025-01-01T10:30:00Z", "2025-01-02T17:45:00Z"
+    summary = store.rollup_summary(FORM_ID, since, until)
+
+    frame = store.read_table(FORM_ID, since, until).to_pandas()
+    assert summary.response_count == len(frame)
+    expected = frame[summary.sums.index].mean()
+    assert summary.score_means.round(6).equals(expected.round(6))
+
+    empty = store.rollup_summary(FORM_ID, "2025-02-01T00:00:00Z", None)
+    assert empty.response_count == 0 and empty.domain_medians.isna().all()
+
+
+def test_fetch_bookkeeping_keeps_the_version(store):
+    version = get_dataset_version(store.path)
+    store.mark_fetched(FORM_ID, "2025-01-01T00:00:00Z", "2025-02-01T00:00:00Z")
+    store.set_watermark(FORM_ID, "2025-01-31T00:00:00Z", "2025-02-01T00:00:00Z")
+    assert get_dataset_version(store.path) == version
+    assert (
+        store.missing_ranges(FORM_ID, "2025-01-10T00:00:00Z", "2025-01-20T00:00:00Z")
+        == []
+    )
+
+
+def test_upserts_are_not_taken_for_outside_changes(store):
+    responses = SyntheticResponses(50, datetime(2025, 1, 1), datetime(2025, 1, 2))
+    # Whichever connection closes last checkpoints whatever is left in the log
+    reader = sqlite3.connect(store.path)
+    reader.execute("SELECT count(*) FROM responses").fetchone()
+    store.upsert(FORM_ID, parse_responses_to_columns([responses.item(0)]))
+    version = get_dataset_version(store.path)
+
+    reader.close()
+    assert get_dataset_version(store.path) == version
+
+
+@pytest.mark.parametrize(
+    "role_filter, church_filter",
+    [(ALL_ROLES_OPTION, None), ("Leader", None), (ALL_ROLES_OPTION, "Antioch25")],
+)
+def test_rollup_summary_over_days_matches_a_scan(store, role_filter, church_filter):
+    responses = SyntheticResponses(
+        3000, datetime(2025, 1, 1), datetime(2025, 3, 1), seed=4
+    )
+    for start in range(0, responses.count, 1000):
+        store.upsert(
+            FORM_ID,
+            parse_responses_to_columns(
+                [responses.item(index) for index in range(start, start + 1000)]
+            ),
+        )
+
+    since, until = "2025-01-03T10:30:00Z", "2025-02-20T17:45:00Z"
+    summary = store.rollup_summary(FORM_ID, since, until, role_filter, church_filter)
+
+    frame = store.read_table(FORM_ID, since, until).to_pandas()
+    if role_filter != ALL_ROLES_OPTION:
+        frame = frame[frame["role"] == role_filter]
+    if church_filter is not None:
+        frame = frame[frame["church"] == church_filter]
+    assert summary.response_count == len(frame) > 0
+    expected = frame[summary.sums.index].mean()
+    assert summary.score_means.round(6).equals(expected.round(6))
+    # Medians come from histograms of whole points
+    assert summary.domain_medians.equals(frame[DOMAIN_HEADERS].round().median())
+
+
+def test_rollups_are_rebuilt_for_stores_from_before_the_daily_rollups(store):
+    responses = SyntheticResponses(100, datetime(2025, 1, 1), datetime(2025, 1, 9))
+    store.upsert(
+        FORM_ID,
+        parse_responses_to_columns([responses.item(i) for i in range(100)]),
+    )
+    with store._connect() as conn:
+        conn.execute("DROP TABLE daily_rollups")
+        conn.execute("DELETE FROM rollups")
+        conn.execute("PRAGMA user_version = 1")
+
+    reopened = ResponseStore(store.path)
+    assert reopened.rollup_summary(FORM_ID).response_count == 100
+    stored_roles = set(reopened.read_table(FORM_ID)["role"].drop_null().to_pylist())
+    assert set(reopened.roles(FORM_ID)) == stored_roles - {""}
@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+
+from aggregates import get_aggregate_engine
+from constants import EMPTY_ROLE_OPTION
+from dataset_version import get_dataset_version
+from interfaces.form_response import AGGREGATE_HEADERS, CSV_HEADERS, DOMAIN_HEADERS
+from response_writer import ResponseWriter
+
+
+def _row(role, score):
+    row = dict.fromkeys(CSV_HEADERS)
+    row.update(dict.fromkeys(AGGREGATE_HEADERS, score), role=role)
+    return row
+
+
+@pytest.fixture
+def writer(tmp_path):
+    # A long delay, so only explicit flushes and full batches write
+    writer = ResponseWriter(
+        str(tmp_path / "responses.csv"), max_batch_rows=3, max_batch_delay=3600
+    )
+    writer.reset()
+    return writer
+
+
+def test_rows_are_written_in_batches(writer):
+    writer.write(_row("Leader", 10.0))
+    writer.write(_row("Member", 20.0))
+    assert len(pd.read_csv(writer.path)) == 0
+
+    writer.write(_row("Member", 30.0))
+    assert len(pd.read_csv(writer.path)) == 3
+
+    writer.write(_row("Leader", 40.0))
+    writer.flush()
+    assert pd.read_csv(writer.path)["role"].tolist() == [
+        "Leader",
+        "Member",
+        "Member",
+        "Leader",
+    ]
+
+
+def test_engine_matches_every_committed_version(writer):
+    engine = get_aggregate_engine(writer.path)
+    writer.write_many([_row("Leader", 10.0), _row("Member", 20.0)])
+    writer.write(_row("Member", 30.0))
+    # Buffered rows aren't in the file, so they aren't in the engine yet
+    version = get_dataset_version(writer.path)
+    summary = engine.summary("Member", revision=version.revision)
+    assert summary.loc[AGGREGATE_HEADERS[0], "mean"] == 20.0
+
+    writer.flush()
+    version = get_dataset_version(writer.path)
+    summary = engine.summary(revision=version.revision)
+    assert summary.loc[AGGREGATE_HEADERS[0], "count"] == 3
+    assert summary.loc[AGGREGATE_HEADERS[0], "mean"] == 20.0
+
+
+def test_engine_is_stale_after_an_outside_change(writer):
+    engine = get_aggregate_engine(writer.path)
+    writer.write_many([_row("Leader", 10.0)])
+    with open(writer.path, "a") as f:
+        f.write(",".join([""] * len(CSV_HEADERS)) + "\n")
+    version = get_dataset_version(writer.path)
+    assert engine.summary(revision=version.revision) is None
+
+    # Later appends by this process don't make it current again
+    writer.write_many([_row("Leader", 20.0)])
+    version = get_dataset_version(writer.path)
+    assert engine.summary(revision=version.revision) is None
+
+    writer.reset()
+    version = get_dataset_version(writer.path)
+    assert engine.summary(revision=version.revision) is not None
+
+
+def test_engine_summarises_medians_without_the_rows(writer):
+    engine = get_aggregate_engine(writer.path)
+    writer.write_many(
+        [_row("Leader", 10.0), _row("Member", 20.0), _row(None, 35.0)]
+        + [_row("Member", 30.0)]
+    )
+    revision = get_dataset_version(writer.path).revision
+    frame = pd.read_csv(writer.path)
+
+    summary = engine.rollup_summary(revision=revision)
+    assert summary.response_count == 4
+    assert summary.domain_medians.equals(frame[DOMAIN_HEADERS].median())
+    members = engine.rollup_summary("Member", revision=revision)
+    assert members.response_count == 2
+    assert members.domain_medians.iloc[0] == 25.0
+    assert members.score_means.iloc[-1] == 25.0
+    assert engine.rollup_summary(EMPTY_ROLE_OPTION).response_count == 1
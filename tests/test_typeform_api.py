@@ -0,0 +1,87 @@
+from datetime import datetime, timezone
+
+import pyarrow.parquet as pq
+import pytest
+
+import typeform_api
+from parquet_export import PartitionedParquetWriter
+from typeform_mock import SyntheticResponses
+
+FORM_ID = "form"
+PAGE_SIZE = 10
+
+responses = SyntheticResponses(
+    100,
+    datetime(2025, 1, 15, tzinfo=timezone.utc),
+    datetime(2025, 3, 15, tzinfo=timezone.utc),
+)
+
+
+class FakeTypeform:
+    """Serves pages of responses the way typeform_mock's API does."""
+
+    def __init__(self):
+        self.requests = []
+        self.fail_after = None
+
+    def get_responses_page(self, form_id, params, use_cache=False):
+        if self.fail_after is not None and len(self.requests) >= self.fail_after:
+            raise ConnectionError("interrupted")
+        self.requests.append(dict(params))
+        first, end = responses.index_range(params.get("since"), params.get("until"))
+        if params.get("after"):
+            first = max(first, responses.index_of(params["after"]) + 1)
+        page_end = min(end, first + min(params["page_size"], PAGE_SIZE))
+        data = {"items": [responses.item(i) for i in range(first, page_end)]}
+        if page_end < end:
+            data["page"] = {"after": responses.token(page_end - 1)}
+        return data
+
+
+@pytest.fixture
+def typeform(monkeypatch):
+    fake = FakeTypeform()
+    monkeypatch.setattr(typeform_api, "FORM_ID", FORM_ID)
+    monkeypatch.setattr(typeform_api, "_client", fake)
+    return fake
+
+
+def test_interrupted_export_resumes_with_the_pinned_range(typeform, tmp_path):
+    typeform.fail_after = 4
+    with pytest.raises(ConnectionError):
+        typeform_api.export_history(str(tmp_path))
+    since, until = PartitionedParquetWriter(str(tmp_path), FORM_ID, None, None).bounds
+    assert since == responses.submitted_at(0) and until is not None
+
+    typeform.fail_after = None
+    resumed_from = len(typeform.requests)
+    typeform_api.export_history(str(tmp_path))
+    slices = set(typeform_api._split_range(since, until))
+    assert len(slices) > 1
+    assert {
+        (params["since"], params["until"])
+        for params in typeform.requests[resumed_from:]
+    } <= slices
+    ids = pq.read_table(str(tmp_path))["response_id"].to_pylist()
+    assert sorted(ids) == [responses.token(i) for i in range(100)]
+
+
+def test_ranges_without_a_start_are_sliced_from_the_oldest_response(typeform):
+    slices = typeform_api._split_range(None, "2025-04-01T00:00:00Z")
+    assert len(slices) == 3
+    assert slices[0][0] is None and slices[-1][1] == "2025-04-01T00:00:00Z"
+    # The first slice starts at the oldest response
+    assert slices[0][1] == "2025-02-13T23:59:59Z"
+
+
+def test_slice_pages_arrive_in_order_and_resume_from_any_position(typeform):
+    slices = typeform_api._split_range(None, "2025-04-01T00:00:00Z")
+    pages = list(typeform_api._iter_slice_pages(slices))
+    ids = [item["token"] for items, _ in pages for item in items]
+    assert ids == [responses.token(i) for i in range(100)]
+
+    for index, (_, position) in enumerate(pages):
+        resumed = list(typeform_api._iter_slice_pages(slices, position))
+        assert [items for items, _ in resumed] == [
+            items for items, _ in pages[index + 1 :]
+        ]
@@ -0,0 +1,79 @@
+import pytest
+
+from typeform_client import TypeformClient
+
+PAST_RANGE = {"since": "2025-01-01T00:00:00Z", "until": "2025-02-01T00:00:00Z"}
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+    url = "https://api.typeform.test/forms/form/responses"
+
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    client = TypeformClient(
+        "token",
+        requests_per_second=0,
+        pool_size=1,
+        base_url="https://api.typeform.test",
+        cache_dir=str(tmp_path / "cache"),
+        cache_ttl=300,
+    )
+    client.requests = []
+
+    def get(url, params, timeout):
+        client.requests.append(dict(params))
+        return FakeResponse({"items": [len(client.requests)]})
+
+    monkeypatch.setattr(client._session, "get", get)
+    return client
+
+
+def test_pages_of_past_ranges_are_cached(client):
+    first = client.get_responses_page("form", PAST_RANGE, use_cache=True)
+    second = client.get_responses_page("form", PAST_RANGE, use_cache=True)
+    assert first == second == {"items": [1]}
+    assert len(client.requests) == 1
+
+    # Any part of the key makes it another page
+    client.get_responses_page("form", {**PAST_RANGE, "after": "x"}, use_cache=True)
+    assert len(client.requests) == 2
+
+
+def test_open_and_future_ranges_are_not_cached(client):
+    for params in (
+        {"since": "2025-01-01T00:00:00Z", "until": None},
+        {"since": "2025-01-01T00:00:00Z", "until": "9999-01-01T00:00:00Z"},
+    ):
+        client.get_responses_page("form", params, use_cache=True)
+        client.get_responses_page("form", params, use_cache=True)
+    assert len(client.requests) == 4
+
+
+def test_cache_is_only_used_when_asked_for(client):
+    client.get_responses_page("form", PAST_RANGE, use_cache=True)
+    assert client.get_responses_page("form", PAST_RANGE) == {"items": [2]}
+    assert len(client.requests) == 2
+
+
+def test_expired_pages_are_fetched_again(client):
+    client.cache_ttl = 1e-9
+    client.get_responses_page("form", PAST_RANGE, use_cache=True)
+    client.get_responses_page("form", PAST_RANGE, use_cache=True)
+    assert len(client.requests) == 2
+
+
+def test_a_negative_rate_is_rejected():
+    with pytest.raises(ValueError):
+        TypeformClient("token", requests_per_second=-1, pool_size=1)
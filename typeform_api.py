@@ -1,99 +1,387 @@
-import csv
+import argparse
 import os
-from datetime import datetime
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
-import pandas as pd
-import requests
 from dotenv import load_dotenv
 
-from constants import COMPARISON_CSV_FILE, CSV_FILE
-from interfaces.form_response import CSV_HEADERS, FormResponse
+from constants import CSV_FILE
+from fetch_coordinator import FetchCoordinator
+from instrumentation import RESPONSES_PARSED, STAGE_SECONDS
+from interfaces.form_response import parse_responses_to_columns
+from parquet_export import PartitionedParquetWriter
+from response_store import TIMESTAMP_FORMAT, ResponseStore, format_timestamp
+from response_writer import get_response_writer
+from typeform_client import TypeformClient
 
 load_dotenv()
 
 TYPEFORM_API_TOKEN = os.getenv("TYPEFORM_API_TOKEN")
 FORM_ID = os.getenv("TYPEFORM_FORM_ID")
 
+# Concurrency for range fetches. Typeform allows 2 requests per second per
+# account on the Responses API, and one rate limiter is shared by all
+# workers, so extra workers don't raise that ceiling. They only overlap the
+# latency of slow pages: beyond about REQUESTS_PER_SECOND times the page
+# latency in seconds, further workers just wait for the limiter.
+FETCH_WORKERS = int(os.getenv("TYPEFORM_FETCH_WORKERS", "4"))
+FETCH_SLICE_DAYS = int(os.getenv("TYPEFORM_FETCH_SLICE_DAYS", "30"))
+# Pages each slice of a history export fetches ahead of the Parquet writer
+PREFETCH_PAGES = int(os.getenv("TYPEFORM_PREFETCH_PAGES", "2"))
+# 0 disables rate limiting, e.g. against the local mock API
+REQUESTS_PER_SECOND = float(os.getenv("TYPEFORM_REQUESTS_PER_SECOND", "2"))
+if REQUESTS_PER_SECOND < 0:
+    raise ValueError(
+        f"TYPEFORM_REQUESTS_PER_SECOND must be 0 (unlimited) or positive, "
+        f"not {REQUESTS_PER_SECOND}"
+    )
+
+PARQUET_EXPORT_DIR = os.getenv("PARQUET_EXPORT_DIR", "form_history")
+# Seconds between progress reports of a history export
+PROGRESS_INTERVAL = 5
+
+
+_parse_seconds = STAGE_SECONDS.labels("parse")
+_store_seconds = STAGE_SECONDS.labels("store_upsert")
+_responses_parsed = RESPONSES_PARSED.labels("fetch")
+
+_coordinator = FetchCoordinator()
 
-def fetch_typeform_responses(start_datetime, end_datetime, is_comparison=False):
+_client = TypeformClient(
+    TYPEFORM_API_TOKEN,
+    requests_per_second=REQUESTS_PER_SECOND,
+    pool_size=FETCH_WORKERS,
+)
+
+
+def _oldest_submitted_at(until_param):
+    """Return when the oldest completed response up to until was submitted."""
+    params = {
+        "response_type": "completed",
+        "page_size": 1,
+        "sort": "submitted_at,asc",
+        "until": until_param,
+    }
+    items = _client.get_responses_page(FORM_ID, params).get("items", [])
+    return items[0]["submitted_at"] if items else None
+
+
+def _split_range(since_param, until_param):
     """
-    Fetch responses from Typeform API between start_datetime and end_datetime,
-    and overwrite the form_responses.csv file.
+    Split [since, until] into consecutive, non-overlapping time slices of
+    FETCH_SLICE_DAYS. A range without a start is sliced from the oldest
+    response on, which takes one extra request to find.
     """
-    url = f"https://api.typeform.com/forms/{FORM_ID}/responses"
-    headers = {"Authorization": f"Bearer {TYPEFORM_API_TOKEN}"}
+    start_param = since_param or _oldest_submitted_at(until_param)
+    if start_param is None:
+        # Nothing to slice: the range holds no responses yet
+        return [(since_param, until_param)]
 
-    # Format datetime as ISO string without encoding issues
-    since_param = (
-        start_datetime.strftime("%Y-%m-%dT%H:%M:%SZ") if start_datetime else None
+    since = datetime.strptime(start_param, TIMESTAMP_FORMAT)
+    until = (
+        datetime.strptime(until_param, TIMESTAMP_FORMAT)
+        if until_param
+        else datetime.now(timezone.utc).replace(tzinfo=None)
     )
-    until_param = end_datetime.strftime("%Y-%m-%dT%H:%M:%SZ") if end_datetime else None
+    step = timedelta(days=FETCH_SLICE_DAYS)
 
+    # The first slice keeps the range's own start, so the slices always
+    # cover exactly the range asked for
+    slices = []
+    slice_since = since
+    while slice_since + step < until:
+        slice_until = slice_since + step - timedelta(seconds=1)
+        slices.append(
+            (
+                slice_since.strftime(TIMESTAMP_FORMAT) if slices else since_param,
+                slice_until.strftime(TIMESTAMP_FORMAT),
+            )
+        )
+        slice_since = slice_until + timedelta(seconds=1)
+    slices.append(
+        (slice_since.strftime(TIMESTAMP_FORMAT) if slices else since_param, until_param)
+    )
+    return slices
+
+
+def _iter_pages(since_param, until_param, after=None, use_cache=False):
+    """
+    Yield (items, after token) for each page of completed responses within
+    the range, starting after the given token. Passing the last yielded
+    token back in continues with the next page. See
+    TypeformClient.get_responses_page for use_cache.
+    """
     params = {
         "response_type": "completed",
         "page_size": 1000,
         "since": since_param,
         "until": until_param,
     }
-
-    all_responses = []
-    next_token = None
+    next_token = after
 
     while True:
         if next_token:
             params["after"] = next_token
-        print("Fetching page with url:", url)
-        print("Params:", params)
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        data = response.json()
+        data = _client.get_responses_page(FORM_ID, params, use_cache)
         items = data.get("items", [])
-        all_responses.extend(items)
         next_token = data.get("page", {}).get("after")
+        if items:
+            yield items, next_token
         if not next_token or not items:
             break
 
-    # Parse responses into a DataFrame
-    rows = []
-    for item in all_responses:
-        form_response = FormResponse(item)
-        row = form_response.parse_to_row()
 
-        # answers = {
-        #     a["field"]["ref"]: a.get("text")
-        #     or a.get("email")
-        #     or a.get("number")
-        #     or a.get("date")
-        #     for a in item.get("answers", [])
-        # }
-        # record = {"submitted_at": item.get("submitted_at"), **answers}
-        rows.append(row)
+def _iter_slice_pages(slices, position=None, use_cache=False):
+    """
+    Yield (items, position) for each page of the slices, in order, while up
+    to FETCH_WORKERS slices are fetched concurrently. Each slice buffers at
+    most PREFETCH_PAGES pages ahead of the caller. Passing a yielded
+    position back in continues with the next page.
+    """
+    first, after = position or (0, None)
+    stop = threading.Event()
+    pages = [queue.Queue(maxsize=PREFETCH_PAGES) for _ in slices]
+
+    def put(index, page):
+        while not stop.is_set():
+            try:
+                pages[index].put(page, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fetch(index):
+        if stop.is_set():
+            return
+        slice_after = after if index == first else None
+        try:
+            for page in _iter_pages(*slices[index], slice_after, use_cache):
+                if not put(index, page):
+                    return
+        except Exception as e:
+            put(index, e)
+        else:
+            put(index, None)
+
+    workers = min(FETCH_WORKERS, len(slices) - first)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        try:
+            for index in range(first, len(slices)):
+                pool.submit(fetch, index)
+            for index in range(first, len(slices)):
+                while (page := pages[index].get()) is not None:
+                    if isinstance(page, Exception):
+                        raise page
+                    items, token = page
+                    # The last page of a slice continues with the next slice
+                    yield items, [index, token] if token else [index + 1, None]
+        finally:
+            stop.set()
+
+
+def _store_slice(store, since_param, until_param):
+    """
+    Stream one slice into the store page by page, so only a single page is
+    held in memory at a time. Returns the row count and latest submitted_at.
+    """
+    count = 0
+    latest = None
+    for items, _ in _iter_pages(since_param, until_param):
+        with _parse_seconds.time():
+            columns = parse_responses_to_columns(items)
+        _responses_parsed.inc(len(items))
+        with _store_seconds.time():
+            count += store.upsert(FORM_ID, columns)
+        page_latest = max(columns["submitted_at"])
+        latest = page_latest if latest is None else max(latest, page_latest)
+    return count, latest
+
 
-    df = pd.DataFrame(rows)
-    csv_file_path = COMPARISON_CSV_FILE if is_comparison else CSV_FILE
-    df.to_csv(csv_file_path, index=False)
-    print(f"Saved {len(df)} responses to {csv_file_path}")
+def _store_range(store, since_param, until_param):
+    """
+    Fetch every completed response submitted within the range into the store.
+
+    The range is split into time slices that are streamed concurrently by up
+    to FETCH_WORKERS threads. Returns the row count and latest submitted_at.
+    """
+    slices = _split_range(since_param, until_param)
+    if len(slices) == 1:
+        return _store_slice(store, *slices[0])
+
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(slices))) as pool:
+        results = list(pool.map(lambda bounds: _store_slice(store, *bounds), slices))
+    count = sum(slice_count for slice_count, _ in results)
+    latest = max(
+        (slice_latest for _, slice_latest in results if slice_latest), default=None
+    )
+    return count, latest
+
+
+def sync_typeform_responses(since_param=None):
+    """
+    Incrementally sync the local response store with Typeform.
+
+    Only responses submitted at or after the stored high-water mark are
+    fetched (or after since_param on the very first sync), and they are
+    merged into the store rather than replacing it.
+    """
+    store = ResponseStore()
+    watermark = store.get_watermark(FORM_ID)
+    sync_since = watermark or since_param
+    synced_at = format_timestamp(datetime.now(timezone.utc))
+
+    count, latest = _store_range(store, sync_since, None)
+    store.mark_fetched(FORM_ID, sync_since, synced_at)
+
+    if latest is None or (watermark is not None and watermark > latest):
+        latest = watermark
+    store.set_watermark(FORM_ID, latest, synced_at)
+    print(f"Synced {count} responses since {sync_since}")
+
+
+def _fill_range(store, since_param, until_param):
+    """Fetch the parts of [since, until] the store doesn't cover yet."""
+    for gap_since, gap_until in store.missing_ranges(FORM_ID, since_param, until_param):
+        started = format_timestamp(datetime.now(timezone.utc))
+        count, _ = _store_range(store, gap_since, gap_until)
+        # Responses can still arrive after the fetch started, so anything
+        # later stays a gap and is fetched again next time
+        fetched_until = started if gap_until is None else min(gap_until, started)
+        if gap_since is None or gap_since <= fetched_until:
+            store.mark_fetched(FORM_ID, gap_since, fetched_until)
+        print(f"Stored {count} responses between {gap_since} and {gap_until}")
+
+
+def fill_range(since_param, until_param):
+    """
+    Fetch the parts of [since, until], given as Typeform timestamps, that the
+    store doesn't cover yet. Concurrent calls for overlapping ranges are
+    coalesced.
+    """
+    store = ResponseStore()
+    _coordinator.run(
+        since_param,
+        until_param,
+        lambda: _fill_range(store, since_param, until_param),
+    )
+
+
+def fetch_typeform_responses(start_datetime, end_datetime, incremental=False):
+    """
+    Bring the local response store up to date for the range between
+    start_datetime and end_datetime. Callers read the range back from the
+    store (see ResponseStore.read_table); nothing is written to a shared
+    file.
+
+    Only the parts of the range that have not been fetched before are
+    requested from the Typeform API. With incremental=True the range is
+    open-ended: gaps are filled up to the sync high-water mark, and anything
+    newer is picked up by sync_typeform_responses.
+
+    Concurrent calls for overlapping ranges are coalesced, so sessions
+    asking for the same range at the same time share one fetch.
+    """
+    # Format datetime as ISO string without encoding issues
+    since_param = format_timestamp(start_datetime)
+    until_param = format_timestamp(end_datetime)
+
+    if not incremental:
+        fill_range(since_param, until_param)
+        return
+
+    store = ResponseStore()
+    watermark = store.get_watermark(FORM_ID)
+    if watermark:
+        _coordinator.run(
+            since_param, watermark, lambda: _fill_range(store, since_param, watermark)
+        )
+    _coordinator.run(
+        watermark or since_param, None, lambda: sync_typeform_responses(since_param)
+    )
 
 
 def clear_csv():
-    """Clear the CSV file."""
-    with open("form_responses.csv", "w", newline="") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=CSV_HEADERS)
-        writer.writeheader()
-    with open("comparison_form_responses.csv", "w", newline="") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=CSV_HEADERS)
-        writer.writeheader()
+    """Clear the live CSV file."""
+    get_response_writer(CSV_FILE).reset()
 
 
-# Example usage:
-# fetch_typeform_responses(
-#     datetime(2025, 4, 1, 0, 0, 0),
-#     datetime(2025, 7, 31, 23, 59, 59)
-# )
+def export_history(output_dir, since_param=None, until_param=None):
+    """
+    Stream every completed response within the range into month-partitioned
+    Parquet files under output_dir (see PartitionedParquetWriter), resuming
+    from the directory's checkpoint if an earlier run was interrupted.
+    """
+    writer = PartitionedParquetWriter(output_dir, FORM_ID, since_param, until_param)
+    if writer.complete:
+        print(f"{output_dir} already holds the complete export ({writer.rows} rows)")
+        return
+    if writer.after:
+        print(f"Resuming after {writer.rows} rows (partition {writer.partition})")
 
-if __name__ == "__main__":
-    fetch_typeform_responses(
-        # datetime(2025, 4, 1, 0, 0, 0),
-        None,
-        datetime(2025, 7, 31, 23, 59, 59),
+    if writer.bounds is None:
+        # Pin an open end to now, and an open start to the oldest response,
+        # so a resumed export slices the range and pages it the same way
+        until_param = until_param or format_timestamp(datetime.now(timezone.utc))
+        writer.bounds = [since_param or _oldest_submitted_at(until_param), until_param]
+        writer.flush()
+
+    resumed_rows = writer.rows
+    started = time.perf_counter()
+    reported = started
+    fetched = 0
+    # Pages fetched after the last checkpoint are requested again when an
+    # interrupted export resumes. The pinned range has ended, so within
+    # TYPEFORM_CACHE_TTL of the interruption the page cache serves them.
+    slices = _split_range(*writer.bounds)
+    pages = _iter_slice_pages(slices, writer.after, use_cache=True)
+    for items, after in pages:
+        with _parse_seconds.time():
+            columns = parse_responses_to_columns(items)
+        _responses_parsed.inc(len(items))
+        writer.add_page(columns, after)
+        fetched += len(items)
+
+        now = time.perf_counter()
+        if now - reported >= PROGRESS_INTERVAL:
+            reported = now
+            print(
+                f"{resumed_rows + fetched} rows, {fetched / (now - started):.0f} rows/s, "
+                f"partition {writer.partition}, up to {max(columns['submitted_at'])}"
+            )
+    writer.finish()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Exported {fetched} rows in {elapsed:.1f}s "
+        f"({fetched / elapsed if elapsed else 0:.0f} rows/s); "
+        f"{writer.rows} rows in {output_dir}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export the form's full response history to Parquet files "
+        "partitioned by month. Interrupted exports resume where they stopped."
+    )
+    parser.add_argument("--output", default=PARQUET_EXPORT_DIR)
+    parser.add_argument("--since", help="e.g. 2025-04-01T00:00:00Z")
+    parser.add_argument("--until", help="e.g. 2025-07-31T23:59:59Z")
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="discard the checkpoint and existing partitions and start over",
     )
+    args = parser.parse_args()
+
+    if args.restart and os.path.isdir(args.output):
+        shutil.rmtree(args.output)
+    export_history(args.output, args.since, args.until)
+
+
+if __name__ == "__main__":
+    main()
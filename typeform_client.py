@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+from instrumentation import STAGE_SECONDS, TYPEFORM_PAGES, TYPEFORM_RETRIES
+
+load_dotenv()
+
+TYPEFORM_API_URL = os.getenv("TYPEFORM_API_URL", "https://api.typeform.com")
+TYPEFORM_CACHE_DIR = os.getenv("TYPEFORM_CACHE_DIR", ".typeform_cache")
+TYPEFORM_CACHE_TTL = float(os.getenv("TYPEFORM_CACHE_TTL", "300"))
+
+# (connect, read) timeouts in seconds
+REQUEST_TIMEOUT = (5, 60)
+MAX_ATTEMPTS = 6
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RetryableResponseError(requests.HTTPError):
+    """A 429 or 5xx response, carrying the server's Retry-After in seconds."""
+
+    def __init__(self, response):
+        super().__init__(
+            f"{response.status_code} from {response.url}", response=response
+        )
+        try:
+            self.retry_after = float(response.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            self.retry_after = None
+
+
+_backoff = wait_exponential(multiplier=0.5, max=30)
+
+_pages_from_api = TYPEFORM_PAGES.labels("api")
+_pages_from_cache = TYPEFORM_PAGES.labels("cache")
+_request_seconds = STAGE_SECONDS.labels("typeform_request")
+
+
+def _wait(retry_state):
+    """Honour Retry-After when the server sent one, else back off exponentially."""
+    TYPEFORM_RETRIES.inc()
+    error = retry_state.outcome.exception()
+    if isinstance(error, RetryableResponseError) and error.retry_after is not None:
+        return error.retry_after
+    return _backoff(retry_state)
+
+
+class _RateLimiter:
+    """
+    Spaces out requests shared by all fetch workers to stay under a rate.
+    A rate of 0 means unlimited.
+    """
+
+    def __init__(self, requests_per_second):
+        if requests_per_second < 0:
+            raise ValueError(
+                f"requests_per_second must be >= 0, not {requests_per_second}"
+            )
+        self.interval = 1 / requests_per_second if requests_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class TypeformClient:
+    """
+    Thread-safe client for the Typeform Responses API.
+
+    Requests share one keep-alive session and a rate limiter, time out, and
+    are retried with exponential backoff on connection errors, 429s and 5xx
+    responses. Callers can opt into caching pages on disk for cache_ttl
+    seconds, keyed by (form id, since, until, after), so repeated identical
+    requests are served locally. Only pages of ranges that ended in the
+    past are cached; open ranges can still gain responses.
+    """
+
+    def __init__(
+        self,
+        token,
+        requests_per_second,
+        pool_size,
+        base_url=TYPEFORM_API_URL,
+        cache_dir=TYPEFORM_CACHE_DIR,
+        cache_ttl=TYPEFORM_CACHE_TTL,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        self._rate_limiter = _RateLimiter(requests_per_second)
+
+        self._session = requests.Session()
+        self._session.headers["Authorization"] = f"Bearer {token}"
+        adapter = HTTPAdapter(pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def get_responses_page(self, form_id, params, use_cache=False):
+        """
+        Return the decoded JSON of one page of GET /forms/{form_id}/responses.
+
+        With use_cache, pages of ranges that ended in the past may be served
+        from and saved to the page cache. A cached page can be up to
+        cache_ttl seconds old, so callers that record a range as fetched
+        must not use it.
+        """
+        cache_path = None
+        if use_cache and self._is_cacheable(params):
+            cache_path = self._cache_path(form_id, params)
+            cached = self._read_cache(cache_path)
+            if cached is not None:
+                _pages_from_cache.inc()
+                return cached
+
+        data = self._request(f"{self.base_url}/forms/{form_id}/responses", params)
+        if cache_path is not None:
+            self._write_cache(cache_path, data)
+        _pages_from_api.inc()
+        return data
+
+    @retry(
+        retry=retry_if_exception_type(
+            (RetryableResponseError, requests.ConnectionError, requests.Timeout)
+        ),
+        wait=_wait,
+        stop=stop_after_attempt(MAX_ATTEMPTS),
+        reraise=True,
+    )
+    def _request(self, url, params):
+        self._rate_limiter.wait()
+        with _request_seconds.time():
+            response = self._session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise RetryableResponseError(response)
+        response.raise_for_status()
+        return response.json()
+
+    def _is_cacheable(self, params):
+        until = params.get("until")
+        # Typeform timestamps are ISO 8601 UTC and sort lexicographically
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        return self.cache_ttl > 0 and until is not None and until < now
+
+    def _cache_path(self, form_id, params):
+        key = json.dumps(
+            [form_id, params.get("since"), params.get("until"), params.get("after")]
+        )
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _read_cache(self, cache_path):
+        try:
+            if time.time() - os.path.getmtime(cache_path) > self.cache_ttl:
+                return None
+            with open(cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, cache_path, data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial page
+        temp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, cache_path)
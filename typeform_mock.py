@@ -0,0 +1,288 @@
+"""
+Offline stand-in for the Typeform Responses API, backed by synthetic data.
+
+Serve a million synthetic responses on port 8765 with 50ms latency and 1%
+injected errors, then point the dashboard at it:
+
+    python typeform_mock.py serve --responses 1000000 --latency 0.05 --error-rate 0.01
+    TYPEFORM_API_URL=http://localhost:8765 streamlit run dashboard.py
+
+Or replay synthetic webhook deliveries against a running dashboard:
+
+    python typeform_mock.py send-webhooks http://localhost:8501/api/4g53n9xd5o --count 10000
+"""
+
+import argparse
+import asyncio
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+from tornado.web import Application, RequestHandler
+
+from interfaces.form_response import DOMAIN_HEADERS, SUBDOMAIN_MAPPING, FieldIds
+from response_store import TIMESTAMP_FORMAT
+
+ROLES = ["Leader", "Member", "Pastor", "Missionary", "Staff", None]
+CHURCHES = [f"Antioch{number}" for number in range(20, 40)]
+FIRST_NAMES = ["Emily", "Grace", "Daniel", "Joshua", "Rachel", "Samuel", "Hannah"]
+LAST_NAMES = ["Goh", "Tan", "Lim", "Ng", "Lee", "Wong", "Chua"]
+
+MAX_PAGE_SIZE = 1000
+DEFAULT_PAGE_SIZE = 25
+
+
+class SyntheticResponses:
+    """
+    A deterministic, lazily generated set of Typeform responses.
+
+    Response i is submitted at start + i * step, so the set is sorted by
+    submitted_at and any since/until range maps to an index range without
+    materialising the responses. Items are generated on demand from a
+    per-index seed, so memory use doesn't depend on count.
+    """
+
+    def __init__(self, count, start, end, seed=0):
+        self.count = count
+        self.start = start
+        self.step = (end - start) / max(count, 1)
+        self.seed = seed
+
+    def submitted_at(self, index):
+        return (self.start + self.step * index).strftime(TIMESTAMP_FORMAT)
+
+    def token(self, index):
+        return f"r{index:09d}"
+
+    def index_of(self, token):
+        return int(token[1:])
+
+    def index_range(self, since=None, until=None):
+        """Return [first, end) indices of responses submitted within [since, until]."""
+        first, end = 0, self.count
+        if since:
+            moment = datetime.strptime(since, TIMESTAMP_FORMAT).replace(
+                tzinfo=timezone.utc
+            )
+            first = max(first, self._first_index_at_or_after(moment))
+        if until:
+            moment = datetime.strptime(until, TIMESTAMP_FORMAT).replace(
+                tzinfo=timezone.utc
+            ) + timedelta(seconds=1)
+            end = min(end, self._first_index_at_or_after(moment))
+        return first, max(first, end)
+
+    def _first_index_at_or_after(self, moment):
+        if moment <= self.start:
+            return 0
+        index = int((moment - self.start) / self.step)
+        # Timestamps are truncated to whole seconds, so settle the boundary
+        # by comparing formatted values.
+        target = moment.strftime(TIMESTAMP_FORMAT)
+        while index > 0 and self.submitted_at(index - 1) >= target:
+            index -= 1
+        while index < self.count and self.submitted_at(index) < target:
+            index += 1
+        return min(index, self.count)
+
+    def item(self, index):
+        """Build response `index` in the shape of a Responses API item."""
+        rng = random.Random(self.seed * 1_000_003 + index)
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        role = rng.choice(ROLES)
+        church = rng.choice(CHURCHES)
+
+        answers = [
+            {
+                "field": {"id": FieldIds.respondent.value, "type": "short_text"},
+                "type": "text",
+                "text": name,
+            },
+            {
+                "field": {"id": FieldIds.email.value, "type": "email"},
+                "type": "email",
+                "email": f"{name.lower().replace(' ', '.')}{index}@example.com",
+            },
+            {
+                "field": {"id": FieldIds.church.value, "type": "short_text"},
+                "type": "text",
+                "text": church,
+            },
+            # Answers the dashboard doesn't map to a column
+            {
+                "field": {"id": "consentXq81", "type": "yes_no"},
+                "type": "boolean",
+                "boolean": True,
+            },
+        ]
+        if role is not None:
+            answers.append(
+                {
+                    "field": {"id": FieldIds.role.value, "type": "short_text"},
+                    "type": "text",
+                    "text": role,
+                }
+            )
+
+        # Subdomain scores are 0-100 around a per-respondent baseline; each
+        # domain is scored out of 25 from its subdomains.
+        baseline = rng.gauss(70, 12)
+        variables = []
+        domain_scores = []
+        subdomain_scores = []
+        for domain in DOMAIN_HEADERS:
+            scores = [
+                min(100, max(0, round(rng.gauss(baseline, 10))))
+                for _ in SUBDOMAIN_MAPPING[domain]
+            ]
+            domain_score = round(sum(scores) / len(scores) / 4)
+            domain_scores.append(domain_score)
+            subdomain_scores.extend(scores)
+            variables.append({"key": domain, "type": "number", "number": domain_score})
+            variables.extend(
+                {"key": subdomain, "type": "number", "number": score}
+                for subdomain, score in zip(SUBDOMAIN_MAPPING[domain], scores)
+            )
+        variables.append(
+            {"key": "score", "type": "number", "number": sum(domain_scores)}
+        )
+        variables.append(
+            {
+                "key": "finalpercentage",
+                "type": "number",
+                "number": round(sum(subdomain_scores) / len(subdomain_scores)),
+            }
+        )
+
+        submitted_at = self.submitted_at(index)
+        return {
+            "landing_id": self.token(index),
+            "token": self.token(index),
+            "response_id": self.token(index),
+            "landed_at": submitted_at,
+            "submitted_at": submitted_at,
+            "metadata": {"platform": "other", "browser": "default"},
+            "answers": answers,
+            "variables": variables,
+        }
+
+    def webhook_event(self, index):
+        """Wrap response `index` in the payload Typeform POSTs to webhooks."""
+        return {
+            "event_id": f"evt{index:09d}",
+            "event_type": "form_response",
+            "form_response": self.item(index),
+        }
+
+
+class MockResponsesHandler(RequestHandler):
+    """GET /forms/{form_id}/responses with page_size, since, until and after."""
+
+    def initialize(self, responses, latency, error_rate):
+        self.responses = responses
+        self.latency = latency
+        self.error_rate = error_rate
+
+    async def get(self, form_id):
+        if self.latency:
+            await asyncio.sleep(random.expovariate(1 / self.latency))
+
+        if random.random() < self.error_rate:
+            if random.random() < 0.5:
+                self.set_status(429)
+                self.set_header("Retry-After", "1")
+            else:
+                self.set_status(503)
+            self.write({"code": "injected_error"})
+            return
+
+        page_size = min(
+            int(self.get_argument("page_size", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE
+        )
+        first, end = self.responses.index_range(
+            self.get_argument("since", None), self.get_argument("until", None)
+        )
+        after = self.get_argument("after", None)
+        if after:
+            first = max(first, self.responses.index_of(after) + 1)
+
+        page_end = min(end, first + page_size)
+        items = [self.responses.item(index) for index in range(first, page_end)]
+        body = {
+            "total_items": end - first,
+            "page_count": -(-(end - first) // page_size),
+            "items": items,
+        }
+        if page_end < end:
+            body["page"] = {"after": self.responses.token(page_end - 1)}
+        self.write(body)
+
+
+def make_app(responses, latency=0.0, error_rate=0.0):
+    return Application(
+        [
+            (
+                r"/forms/([^/]+)/responses",
+                MockResponsesHandler,
+                dict(responses=responses, latency=latency, error_rate=error_rate),
+            )
+        ]
+    )
+
+
+def send_webhooks(url, responses, count, workers):
+    """POST `count` synthetic webhook events to url, `workers` at a time."""
+    session = requests.Session()
+
+    def send(index):
+        return session.post(url, json=responses.webhook_event(index)).status_code
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(send, range(count)))
+    for status in sorted(set(statuses)):
+        print(f"{status}: {statuses.count(status)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--responses", type=int, default=10_000)
+    parser.add_argument("--start", default="2024-01-01T00:00:00Z")
+    parser.add_argument("--end", default="2025-08-01T00:00:00Z")
+    parser.add_argument("--seed", type=int, default=0)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="serve the mock Responses API")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency", type=float, default=0.0, help="mean seconds")
+    serve.add_argument("--error-rate", type=float, default=0.0)
+
+    webhooks = commands.add_parser("send-webhooks", help="POST webhook events")
+    webhooks.add_argument("url")
+    webhooks.add_argument("--count", type=int, default=1000)
+    webhooks.add_argument("--workers", type=int, default=8)
+
+    args = parser.parse_args()
+    responses = SyntheticResponses(
+        args.responses,
+        datetime.strptime(args.start, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc),
+        datetime.strptime(args.end, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc),
+        seed=args.seed,
+    )
+
+    if args.command == "serve":
+
+        async def serve_forever():
+            make_app(responses, args.latency, args.error_rate).listen(args.port)
+            print(f"Serving {args.responses} responses on port {args.port}")
+            await asyncio.Event().wait()
+
+        asyncio.run(serve_forever())
+    else:
+        send_webhooks(
+            args.url, responses, min(args.count, args.responses), args.workers
+        )
+
+
+if __name__ == "__main__":
+    main()
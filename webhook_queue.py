@@ -0,0 +1,96 @@
+import json
+import os
+import queue
+import threading
+import time
+
+from constants import CSV_FILE
+from instrumentation import (
+    RESPONSES_PARSED,
+    WEBHOOK_LATENCY_SECONDS,
+    WEBHOOKS,
+    Gauge,
+)
+from interfaces.form_response import FormResponse
+from response_writer import get_response_writer
+
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "1"))
+
+_webhooks_processed = WEBHOOKS.labels("processed")
+_webhooks_failed = WEBHOOKS.labels("failed")
+_responses_parsed = RESPONSES_PARSED.labels("webhook")
+
+
+class WebhookQueue:
+    """
+    Bounded queue of raw webhook bodies, drained by background worker threads.
+
+    Request handlers only enqueue; JSON decoding, FormResponse construction
+    and persistence happen on the workers, off Tornado's IOLoop. When the
+    queue is full, enqueue() returns False so the caller can push back.
+    """
+
+    def __init__(self, maxsize=WEBHOOK_QUEUE_SIZE, workers=WEBHOOK_WORKERS):
+        self._queue = queue.Queue(maxsize=maxsize)
+        for _ in range(workers):
+            worker = threading.Thread(target=self._work, daemon=True)
+            worker.start()
+
+    @property
+    def depth(self):
+        """Number of events waiting to be processed."""
+        return self._queue.qsize()
+
+    def enqueue(self, raw_body):
+        try:
+            self._queue.put_nowait((time.perf_counter(), raw_body))
+            return True
+        except queue.Full:
+            return False
+
+    def _work(self):
+        while True:
+            enqueued_at, raw_body = self._queue.get()
+            try:
+                self._process(raw_body)
+                _webhooks_processed.inc()
+                WEBHOOK_LATENCY_SECONDS.observe(time.perf_counter() - enqueued_at)
+            except Exception as e:
+                _webhooks_failed.inc()
+                print("Failed to process webhook:", repr(e))
+            finally:
+                self._queue.task_done()
+
+    def _process(self, raw_body):
+        data = json.loads(raw_body.decode("utf-8"))
+        print("Webhook received:", data["event_id"])
+
+        # Convert into domain object FormResponse
+        form_response = FormResponse(data["form_response"])
+
+        # Flatten and hand to the writer, which appends to the csv file (and
+        # the aggregate engine) in batches
+        row = form_response.parse_to_row()
+        _responses_parsed.inc()
+        get_response_writer(CSV_FILE).write(row)
+
+
+_webhook_queue = None
+_webhook_queue_lock = threading.Lock()
+
+
+def get_webhook_queue():
+    """Return the process-wide webhook queue, starting its workers once."""
+    global _webhook_queue
+    with _webhook_queue_lock:
+        if _webhook_queue is None:
+            _webhook_queue = WebhookQueue()
+        return _webhook_queue
+
+
+Gauge(
+    "cmra_webhook_queue_depth",
+    "Webhook events waiting to be processed.",
+    lambda: _webhook_queue.depth if _webhook_queue is not None else 0,
+)